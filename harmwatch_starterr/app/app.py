@@ -3,9 +3,8 @@ from datetime import datetime
 import pandas as pd
 import streamlit as st
 
-from classify import classify
-from preprocess import clean_text, anonymize_id, extract_domains
-from storage import init_db, insert_df
+from pipeline import DEFAULT_STREAM_CHUNK_ROWS, run as run_pipeline, run_stream
+from storage import init_db, insert_df, posts_frame
 from report import render_html
 
 st.set_page_config(page_title="HarmWatch — Social Harm Analyzer", layout="wide")
@@ -54,27 +53,61 @@ with st.expander("📘 How to use"):
     """)
 
 uploaded = st.file_uploader("Upload CSV (min column: text)", type=["csv"])
+workers = st.sidebar.number_input("Worker processes", min_value=1, max_value=os.cpu_count() or 1, value=1,
+                                  help="Split large uploads across processes for cleaning & classification")
+streaming = st.sidebar.checkbox("Streaming mode (large files)",
+                                help="Process the CSV in chunks and write results straight to disk")
+if streaming:
+    chunk_rows = st.sidebar.number_input("Rows per chunk", min_value=1_000, value=DEFAULT_STREAM_CHUNK_ROWS, step=10_000)
+    stream_to_db = st.sidebar.checkbox("Also save to SQLite")
+
+if uploaded is not None and streaming:
+    if st.button("▶️ Run streaming analysis"):
+        os.makedirs("outputs", exist_ok=True)
+        out_path = f"outputs/classified_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        progress = st.empty()
+        try:
+            agg = run_stream(uploaded, chunksize=int(chunk_rows), workers=workers, out_csv=out_path,
+                             save_db=stream_to_db,
+                             on_chunk=lambda a: progress.info(f"Processed {a.rows:,} rows…"))
+        except ValueError as e:
+            st.error(str(e))
+            st.stop()
+        progress.success(f"Processed {agg.rows:,} rows • results saved to {out_path}"
+                         + (" and data/harmwatch.db" if stream_to_db else ""))
+        st.session_state["stream_agg"] = agg
+
+    agg = st.session_state.get("stream_agg")
+    if agg is not None:
+        st.subheader("Category distribution")
+        st.bar_chart(agg.category_series())
+
+        pivot = agg.daily_pivot()
+        if not pivot.empty:
+            st.subheader("Trend over time (by category)")
+            st.line_chart(pivot)
+
+        st.subheader("Flagged examples")
+        if len(agg.flagged):
+            st.dataframe(agg.flagged[["platform","date","author_hash","url","text","category","risk_level"]])
 
-if uploaded is not None:
+        if st.button("📄 Generate HTML report"):
+            os.makedirs("outputs", exist_ok=True)
+            examples = agg.flagged[["platform","date","author_hash","text","category","risk_level"]].head(10) \
+                if len(agg.flagged) else pd.DataFrame()
+            html = render_html(agg.category_counts, examples.to_html(index=False, escape=True))
+            path = f"outputs/report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html"
+            with open(path,"w",encoding="utf-8") as f:
+                f.write(html)
+            st.success(f"Report saved to {path}")
+elif uploaded is not None:
     df = pd.read_csv(uploaded)
     if "text" not in df.columns:
         st.error("CSV must contain a 'text' column.")
         st.stop()
 
-    for col in ["platform","date","author_id","url"]:
-        if col not in df.columns:
-            df[col] = ""
-
     # Processing
-    df["clean_text"] = df["text"].apply(clean_text)
-    df["author_hash"] = df["author_id"].apply(anonymize_id)
-    df["domains"] = df["text"].apply(extract_domains)
-
-    cats, risks = [], []
-    for t, dlist in zip(df["clean_text"], df["domains"]):
-        c, r = classify(t, dlist)
-        cats.append(c); risks.append(r)
-    df["category"], df["risk_level"] = cats, risks
+    df = run_pipeline(df, workers=workers)
 
     # Dates
     try:
@@ -110,14 +143,8 @@ if uploaded is not None:
         if st.button("🗃️ Save to SQLite (optional)"):
             try:
                 init_db()
-                to_save = df[["platform","date","author_hash","url"]].copy()
-                to_save["domain"] = df["domains"].apply(lambda x: x[0] if isinstance(x, list) and x else "")
-                to_save["text"] = df["text"]
-                to_save["clean_text"] = df["clean_text"]
-                to_save["category"] = df["category"]
-                to_save["risk_level"] = df["risk_level"]
-                insert_df(to_save)
-                st.success("Saved to data/harmwatch.db")
+                stats = insert_df(posts_frame(df))
+                st.success(f"Saved {stats['rows']:,} rows to data/harmwatch.db ({stats['rows_per_sec']:,.0f} rows/s)")
             except Exception as e:
                 st.error(f"Failed to save: {e}")
     with col3:
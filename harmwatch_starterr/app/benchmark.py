@@ -0,0 +1,709 @@
+"""
+HarmWatch benchmark and parity checks.
+
+Run from the app directory:
+    python benchmark.py            # run everything
+    python benchmark.py classify   # single-pass matcher parity + speed
+    python benchmark.py batch      # classify_batch vs. per-row classify loop
+    python benchmark.py backtrack  # pathological inputs for the old wildcard patterns
+    python benchmark.py clean      # clean_text parity + speed on 100k posts
+    python benchmark.py hash       # author hashing backends
+    python benchmark.py domains    # domain extraction on link-heavy posts
+    python benchmark.py storage    # SQLite insert throughput
+    python benchmark.py cache      # classification cache on a repost-heavy stream
+    python benchmark.py rules      # compiling a large rule set vs. loading its cached artifact
+    python benchmark.py lexicon    # keyword matching throughput vs. vocabulary size
+    python benchmark.py routing    # bridge subscription index vs. per-client filter checks
+    python benchmark.py frames     # /stream payload encoders: speed and size, raw and deflated
+    python benchmark.py log        # ingest log appends (batched vs. per-post fsync) and reads
+    python benchmark.py fanout     # load test: bridge with 1, 2 and 4 workers, delivered posts/s
+"""
+import argparse
+import csv
+import os
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+import zlib
+from typing import Callable, Dict, List, Any, Tuple
+
+from classify import PATTERNS, RULES, SHORTLINKS, classify, classify_batch, classify_enhanced
+from urllib.parse import urlparse
+
+from preprocess import (HASH_BACKENDS, STOP_WORDS, URL_REGEX, clean_text, clean_texts, extract_domains,
+                        extract_domains_batch, make_hasher, normalize_domain)
+
+SAMPLE_CSV = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "sample_posts.csv")
+
+FILLER = (
+    "the quick brown fox jumps over lazy cat hello world post today great news lovely "
+    "weather stay safe everyone amazing video watch this thread update release notes"
+).split()
+TRIGGERS = [
+    "kill yourself", "go back", "idiot", "stupid", "you are so dumb", "nobody likes you",
+    "5g towers hide a microchip", "fake news", "hoax", "share your otp", "doxxed", "privacy",
+    "cve-2024-1234", "zero-day", "hacked", "breach", "win a shiny prize", "gift card",
+    "bank will block you", "click this link", "verify your account", "free", "login",
+    "i hate myself", "self-harm", "lonely", "bit.ly/x", "t.co/abc", "xs.idol", "rb.gyro",
+    "ſcum", "ape", "déjà vu", "naïve café", "ＵＲＧＥＮＴ",
+]
+
+
+def reference_near(t: str) -> Dict[str, str]:
+    """Brute-force proximity rules: the earliest 'then' with the closest 'first' at most `within` tokens before it."""
+    toks = re.findall(r"\w+", t)
+    best: Dict[str, Tuple[int, int, int, str]] = {}
+    for idx, (label, first, then, within, _weight, ordered) in enumerate(RULES.near_rules()):
+        for a, b in [(first, then)] if ordered else [(first, then), (then, first)]:
+            a, b = a.lower().split(), b.lower().split()
+            for i in range(len(toks)):
+                if toks[i:i + len(b)] != b:
+                    continue
+                for s in range(i - len(a), max(-1, i - len(a) - within - 1), -1):
+                    if toks[s:s + len(a)] == a:
+                        hit = (i, i + len(b), idx, " ".join(toks[s:i + len(b)]))
+                        best[label] = min(best.get(label, hit), hit)
+                        break
+    return {label: hit[3] for label, hit in best.items()}
+
+
+def legacy_classify_enhanced(text: str, domains: List[str] = None) -> Dict[str, Any]:
+    """Reference copy of classify_enhanced before the single-pass matcher, plus brute-force proximity rules."""
+    t = text.lower() if text else ""
+    matched = []
+    why = []
+    risk = 0
+    near = reference_near(t)
+    for k in RULES.labels:
+        m = PATTERNS[k].search(t) if k in PATTERNS else None
+        if m:
+            matched.append(k)
+            why.append(f"{k}: '{m.group(0)}'")
+        elif k in near:
+            matched.append(k)
+            why.append(f"{k}: '{near[k]}'")
+    for dom in SHORTLINKS:
+        if dom in t:
+            if "scam_phishing" not in matched:
+                matched.append("scam_phishing")
+                why.append(f"shortlink domain: {dom}")
+    if domains:
+        for dom in domains:
+            if dom in SHORTLINKS:
+                if "scam_phishing" not in matched:
+                    matched.append("scam_phishing")
+                    why.append(f"suspicious domain: {dom}")
+    weights = {
+        "scam_phishing": 3, "hacking_exploit": 3, "privacy_risk": 3, "hate_speech": 2,
+        "cyberbullying": 2, "misinformation": 2, "mental_health": 2,
+    }
+    for m in matched:
+        risk += weights.get(m, 1)
+    return {"labels": matched, "risk_score": risk, "why": "; ".join(why) or "—"}
+
+
+def legacy_clean_text(text: str) -> str:
+    """Reference copy of clean_text before precompiled patterns / translate."""
+    if text is None:
+        return ""
+    text = re.sub(r"http\S+", " ", str(text))
+    text = re.sub(r"@\w+", " ", text)
+    text = re.sub(r"#", " ", text)
+    text = re.sub(r"[^A-Za-z0-9\s]", " ", text)
+    text = re.sub(r"\s+", " ", text).strip().lower()
+    text = " ".join(w for w in text.split() if w not in STOP_WORDS)
+    return text
+
+
+def legacy_extract_domains(text: str) -> List[str]:
+    """Reference copy of extract_domains before the authority regex (no normalization)."""
+    domains = []
+    for match in URL_REGEX.findall(text or ""):
+        try:
+            d = urlparse(match).netloc.lower()
+            if d:
+                domains.append(d)
+        except Exception:
+            pass
+    return sorted(set(domains))
+
+
+def load_sample_texts() -> List[str]:
+    with open(SAMPLE_CSV, encoding="utf-8") as f:
+        return [row["text"] for row in csv.DictReader(f)]
+
+
+def synthetic_posts(n: int, hit_rate: float = 0.2, seed: int = 7) -> List[str]:
+    """Generate n posts; roughly hit_rate of them contain one or more trigger phrases."""
+    rng = random.Random(seed)
+    posts = []
+    for _ in range(n):
+        words = [rng.choice(FILLER) for _ in range(rng.randint(5, 60))]
+        if rng.random() < hit_rate:
+            for _ in range(rng.randint(1, 3)):
+                words.insert(rng.randrange(len(words) + 1), rng.choice(TRIGGERS))
+        posts.append(" ".join(words))
+    return posts
+
+
+def timed(fn: Callable, items: List[Any]) -> float:
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    return time.perf_counter() - start
+
+
+def bench_classify(n: int) -> bool:
+    """Check classify_enhanced against the legacy reference and compare speed."""
+    posts = load_sample_texts() + TRIGGERS + [" ".join(TRIGGERS)] + synthetic_posts(n)
+    mismatches = 0
+    for text in posts:
+        new = classify_enhanced(text)
+        old = legacy_classify_enhanced(text)
+        if (new["labels"], new["why"], new["risk_score"]) != (old["labels"], old["why"], old["risk_score"]):
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"  mismatch: {text[:80]!r}\n    new={new}\n    old={old}")
+    print(f"classify parity: {len(posts) - mismatches}/{len(posts)} posts identical")
+
+    old_s = timed(legacy_classify_enhanced, posts)
+    new_s = timed(classify_enhanced, posts)
+    print(f"classify speed: legacy {old_s:.3f}s, single-pass {new_s:.3f}s ({old_s / new_s:.1f}x)")
+    return mismatches == 0
+
+
+def bench_backtrack(n: int) -> bool:
+    """Worst-case inputs for the old unbounded `.*` wildcards vs. the bounded proximity rules."""
+    wildcards = re.compile(r"\b(5g.*microchip|win .* prize|bank.*block|click.*link)\b", re.I)
+    ok = True
+    for reps in (1_000, 2_000, 4_000):
+        for filler in ("5g ", "win ", "click "):
+            t = filler * reps
+            start = time.perf_counter()
+            wildcards.search(t)
+            old_s = time.perf_counter() - start
+            start = time.perf_counter()
+            result = classify_enhanced(t)
+            new_s = time.perf_counter() - start
+            ok = ok and "time budget" not in result["why"]
+            print(f"backtrack {filler.strip()!r} x{reps:,} ({len(t):,} chars): "
+                  f"wildcard regex {old_s * 1000:.1f} ms, classify_enhanced {new_s * 1000:.1f} ms")
+    return ok
+
+
+def bench_batch(n: int) -> bool:
+    """Compare the per-row classify() loop used by the batch page with classify_batch()."""
+    unique = synthetic_posts(n // 2)
+    posts = unique + random.Random(11).choices(unique, k=n - len(unique))  # reposts
+    domains = [["bit.ly"] if i % 50 == 0 else [] for i in range(len(posts))]
+
+    start = time.perf_counter()
+    rows = [classify(t, d) for t, d in zip(posts, domains)]
+    loop_s = time.perf_counter() - start
+    start = time.perf_counter()
+    cols = classify_batch(posts, domains)
+    batch_s = time.perf_counter() - start
+
+    same = rows == list(zip(cols["category"], cols["risk_level"]))
+    print(f"batch parity: {'identical' if same else 'MISMATCH'} over {len(posts)} rows")
+    print(f"batch speed: row loop {loop_s:.3f}s, classify_batch {batch_s:.3f}s ({loop_s / batch_s:.1f}x)")
+    return same
+
+
+def bench_clean(n: int) -> bool:
+    """Check clean_text/clean_texts byte-for-byte against the legacy version and compare speed."""
+    extras = ["@user http://bit.ly/x #Tag", "tabs\tand\nnew\x1clines", "ÀÉÎ naïve ＵＲＧＥＮＴ", "it's", "", None, 3.5]
+    posts = load_sample_texts() + extras + [
+        f"{p} @handle{i} https://example.com/p/{i} #topic{i % 7}" for i, p in enumerate(synthetic_posts(n))
+    ]
+    expected = [legacy_clean_text(p) for p in posts]
+    single = [clean_text(p) for p in posts]
+    same = single == expected and clean_texts(posts) == expected
+    print(f"clean parity: {'identical' if same else 'MISMATCH'} over {len(posts)} posts")
+
+    old_s = timed(legacy_clean_text, posts)
+    new_s = timed(clean_text, posts)
+    start = time.perf_counter()
+    clean_texts(posts)
+    batch_s = time.perf_counter() - start
+    print(f"clean speed: legacy {old_s:.3f}s, clean_text {new_s:.3f}s ({old_s / new_s:.1f}x), "
+          f"clean_texts {batch_s:.3f}s ({old_s / batch_s:.1f}x)")
+    return same
+
+
+def bench_hash(n: int) -> bool:
+    """Throughput of each author hashing backend (uncached)."""
+    ids = [f"user{i}" for i in range(n)]
+    for backend in HASH_BACKENDS:
+        seconds = timed(make_hasher(backend), ids)
+        print(f"hash {backend}: {n / seconds:,.0f} ids/s")
+    return True
+
+
+def bench_domains(n: int) -> bool:
+    """extract_domains / extract_domains_batch vs. the urlparse loop on a link-heavy feed."""
+    hosts = ["bit.ly", "WWW.Example.com", "t.co", "news.site.org:8080", "user@tinyurl.com", "bücher.de"]
+    rng = random.Random(3)
+    posts = [
+        " ".join([p] + [f"https://{rng.choice(hosts)}/{i}?q={j}" for j in range(rng.randint(0, 3))])
+        for i, p in enumerate(synthetic_posts(n))
+    ]
+    expected = [sorted({normalize_domain(d) for d in legacy_extract_domains(p)} - {""}) for p in posts]
+    single = [extract_domains(p) for p in posts]
+    batch = extract_domains_batch(posts)
+    same = single == expected and batch == expected
+    print(f"domains parity (legacy + normalization): {'identical' if same else 'MISMATCH'} over {len(posts)} posts")
+
+    old_s = timed(legacy_extract_domains, posts)
+    new_s = timed(extract_domains, posts)
+    start = time.perf_counter()
+    extract_domains_batch(posts)
+    batch_s = time.perf_counter() - start
+    print(f"domains speed: urlparse loop {old_s:.3f}s, extract_domains {new_s:.3f}s ({old_s / new_s:.1f}x), "
+          f"extract_domains_batch {batch_s:.3f}s ({old_s / batch_s:.1f}x)")
+    return same
+
+
+def bench_storage(n: int) -> bool:
+    """
+    Saving a classified feed: PostStore vs. DataFrame.to_sql on the same indexed schema,
+    and the save path before (to_sql into the unindexed table) and after (PostStore).
+    """
+    import datetime
+    import pandas as pd
+    from pipeline import process_frame
+    from storage import POSTS_SCHEMA, PostStore, _collapse_duplicates, posts_frame
+
+    rng = random.Random(5)
+    hosts = ["bit.ly", "example.com", "t.co", "news.site.org"]
+    start = datetime.datetime(2025, 8, 1)
+    feed = pd.DataFrame({
+        "platform": "twitter",
+        # A month of posts in arrival order, about one in ten with a link
+        "date": [(start + datetime.timedelta(seconds=i * 30 * 86400 // n)).isoformat() for i in range(n)],
+        "author_id": [f"user{rng.randrange(max(1, n // 10))}" for _ in range(n)],
+        "url": "",
+        "text": [p + (f" https://{rng.choice(hosts)}/{i}" if rng.random() < 0.1 else "")
+                 for i, p in enumerate(synthetic_posts(n))],
+    })
+    df = posts_frame(process_frame(feed))
+
+    def to_sql(path: str, indexed: bool) -> float:
+        if indexed:
+            PostStore(path).init_schema()
+        con = sqlite3.connect(path)
+        if not indexed:
+            con.execute(POSTS_SCHEMA)
+        start = time.perf_counter()
+        # to_sql cannot upsert, so reposts are collapsed up front for the indexed table
+        rows = _collapse_duplicates(df) if indexed else df.drop(columns=["content_hash", "rules_version"])
+        rows.to_sql("posts", con, if_exists="append", index=False)
+        con.commit()
+        seconds = time.perf_counter() - start
+        con.close()
+        return seconds
+
+    with tempfile.TemporaryDirectory() as tmp:
+        before_s = to_sql(os.path.join(tmp, "before.db"), indexed=False)
+        same_s = to_sql(os.path.join(tmp, "to_sql.db"), indexed=True)
+        store = PostStore(os.path.join(tmp, "store.db"))
+        store.init_schema()
+        stats = store.insert_df(df)
+        stored = store.con.execute("SELECT SUM(occurrences) FROM posts").fetchone()[0]
+        store.close()
+    print(f"storage, same indexed schema: to_sql {n / same_s:,.0f} rows/s, "
+          f"PostStore {stats['rows_per_sec']:,.0f} rows/s ({same_s / stats['seconds']:.1f}x)")
+    print(f"storage, save path: before (to_sql, no indexes) {n / before_s:,.0f} rows/s, "
+          f"after (PostStore, indexed + dedup) {stats['rows_per_sec']:,.0f} rows/s ({before_s / stats['seconds']:.2f}x)")
+    return stored == n
+
+
+def bench_cache(n: int) -> bool:
+    """classify_enhanced vs. ClassificationCache on a stream where most posts repeat."""
+    from classify_cache import ClassificationCache
+
+    unique = synthetic_posts(max(1, n // 10))
+    rng = random.Random(13)
+    posts = [rng.choice(unique).upper() if i % 3 == 0 else rng.choice(unique) for i in range(n)]
+
+    plain_s = timed(classify_enhanced, posts)
+    cache = ClassificationCache(maxsize=len(unique))
+    start = time.perf_counter()
+    cached = [cache.classify(t) for t in posts]
+    cached_s = time.perf_counter() - start
+
+    same = cached == [classify_enhanced(t) for t in posts]
+    stats = cache.stats()
+    print(f"cache parity: {'identical' if same else 'MISMATCH'} over {n} posts, hit rate {stats['hit_rate']:.1%}")
+    print(f"cache speed: uncached {plain_s:.3f}s, cached {cached_s:.3f}s ({plain_s / cached_s:.1f}x)")
+    return same
+
+
+def synthetic_lexicon(n_terms: int, n_labels: int = 7, seed: int = 17) -> Dict[str, List[str]]:
+    """n_terms distinct 1-3 word phrases spread over n_labels labels."""
+    rng = random.Random(seed)
+    words = FILLER + [w for t in TRIGGERS for w in t.split()]
+    terms = set()
+    while len(terms) < n_terms:
+        terms.add(" ".join(rng.choices(words, k=rng.randint(0, 2)) + [f"{rng.choice(words)}{rng.randrange(16**5):x}"]).lower())
+    ordered = sorted(terms)
+    rng.shuffle(ordered)
+    return {f"label_{i}": sorted(ordered[i::n_labels]) for i in range(n_labels)}
+
+
+def bench_rules(n: int) -> bool:
+    """Build a matcher for a synthetic rule set of n // 10 terms, then reload it from the artifact cache."""
+    import json
+    from classify import load_matcher
+    from rules import load_rules
+
+    lexicon = synthetic_lexicon(max(7, n // 10))
+    labels = {label: {"category": label, "weight": 2,
+                      "pattern": r"\b(" + "|".join(re.escape(t) for t in terms) + r")\b"}
+              for label, terms in lexicon.items()}
+    # A word-bounded pattern joined with punctuation-edged terms: the \b covers only the pattern
+    labels["mixed"] = {"category": "mixed", "weight": 2, "pattern": r"\b(scam)\b", "terms": ["$$$money"]}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "rules.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"version": "bench", "shortlinks": sorted(SHORTLINKS), "labels": labels}, f)
+        rules = load_rules(path)
+        start = time.perf_counter()
+        built = load_matcher(rules, cache_dir=tmp)
+        build_s = time.perf_counter() - start
+        start = time.perf_counter()
+        loaded = load_matcher(rules, cache_dir=tmp)
+        load_s = time.perf_counter() - start
+
+    posts = synthetic_posts(min(n, 2_000)) + [f"look at {t} now" for t in lexicon["label_3"][:100]]
+    posts += ["pay $$$money now", "a scam link", "no$$$money"]
+
+    def separately(t: str):
+        found = {label: p.search(t) for label, p in built.patterns.items()}
+        return {label: m.group(0) for label, m in found.items() if m}
+    same = all(built.scan(t.lower()) == loaded.scan(t.lower()) for t in posts)
+    same = same and all(built.scan(t.lower())[0] == separately(t.lower()) for t in posts)
+    n_terms = sum(len(terms) for terms in lexicon.values())
+    print(f"rules parity: {'identical' if same else 'MISMATCH'} scans over {len(posts)} posts "
+          f"(cached vs. built vs. each pattern alone)")
+    print(f"rules load ({n_terms:,} terms): compile {build_s:.3f}s, cached artifact {load_s:.3f}s "
+          f"({build_s / load_s:.1f}x)")
+    return same
+
+
+def bench_lexicon(n: int) -> bool:
+    """Posts/s vs. vocabulary size: one alternation regex per label, trie regex per label, token Lexicon."""
+    from lexicon import Lexicon
+    from rules import terms_regex
+
+    ok = True
+    for size in (100, 1_000, 10_000, 40_000):
+        lexicon = synthetic_lexicon(size)
+        rng = random.Random(size)
+        posts = synthetic_posts(min(n, 2_000), hit_rate=0.0)
+        for i in range(0, len(posts), 5):  # every 5th post mentions a term
+            posts[i] += " " + rng.choice(lexicon[rng.choice(list(lexicon))])
+        posts = [t.lower() for t in posts]  # classify_enhanced matches lowercased text
+
+        flat = {label: re.compile(r"\b(?:" + "|".join(re.escape(t) for t in terms) + r")\b")
+                for label, terms in lexicon.items()}
+        trie = {label: re.compile(r"\b" + terms_regex(terms) + r"\b") for label, terms in lexicon.items()}
+        engine = Lexicon((t, label, 1) for label, terms in lexicon.items() for t in terms)
+
+        def scan_flat(t):
+            return {label for label, rx in flat.items() if rx.search(t)}
+
+        def scan_trie(t):
+            return {label for label, rx in trie.items() if rx.search(t)}
+
+        expected = [scan_trie(t) for t in posts]
+        same = expected == [set(engine.scan(t)) for t in posts]
+        if size <= 10_000:  # the flat alternation gets too slow to be worth waiting for beyond this
+            same = same and expected == [scan_flat(t) for t in posts]
+        ok = ok and same
+        rates = {"alternation": len(posts) / timed(scan_flat, posts) if size <= 10_000 else None,
+                 "trie regex": len(posts) / timed(scan_trie, posts),
+                 "lexicon": len(posts) / timed(engine.scan, posts)}
+        print(f"lexicon {size:>6,} terms: " + ", ".join(
+            f"{name} {'-' if rate is None else f'{rate:,.0f}'} posts/s" for name, rate in rates.items())
+            + ("" if same else "  MISMATCH"))
+    return ok
+
+
+def bench_routing(n: int) -> bool:
+    """Route n posts to 1,000 filtered subscribers: a filter check per client vs. the bridge's index."""
+    from bridge import RISK_LEVELS, Subscription, SubscriptionIndex, route_keys
+
+    rng = random.Random(23)
+    platforms, sources = ["Twitter", "Reddit", "YouTube", "Instagram"], ["api", "scraper", "manual"]
+    labels = list(RULES.labels)
+    subs = {}
+    for i in range(1000):
+        subs[i] = Subscription(rng.choice([None, *RISK_LEVELS]),
+                               rng.sample(labels, rng.randint(0, 2)),
+                               rng.sample(platforms, rng.randint(0, 1)),
+                               rng.sample(sources, rng.randint(0, 1)))
+    index = SubscriptionIndex()
+    for client, sub in subs.items():
+        index.add(client, sub)
+    posts = [dict(classify_enhanced(t), platform=rng.choice(platforms), source=rng.choice(sources))
+             for t in synthetic_posts(n)]
+    keys = [route_keys(post) for post in posts]
+
+    def route_all(route: Callable) -> Tuple[List[Any], float]:
+        # Both sides reuse the result for repeated keys, as Manager.publish does
+        start = time.perf_counter()
+        routes: Dict[Any, Any] = {}
+        out = []
+        for k in keys:
+            if k not in routes:
+                routes[k] = route(k)
+            out.append(routes[k])
+        return out, time.perf_counter() - start
+
+    scanned, scan_s = route_all(lambda k: {client for client, sub in subs.items() if sub.matches(k)})
+    indexed, index_s = route_all(index.route)
+
+    same = scanned == indexed
+    delivered = sum(map(len, indexed))
+    print(f"routing parity: {'identical' if same else 'MISMATCH'} over {n} posts x {len(subs)} subscribers "
+          f"({delivered / max(1, n):.0f} deliveries per post)")
+    print(f"routing speed: per-client {scan_s:.3f}s, index {index_s:.3f}s ({scan_s / index_s:.1f}x)")
+    return same
+
+
+def bench_frames(n: int) -> bool:
+    """Encode n enriched posts for /stream: json.dumps, the bridge's JSON path and MessagePack."""
+    import json
+    from bridge import CODECS, _json_encode, encode_json
+
+    rng = random.Random(29)
+    posts = []
+    for seq, text in enumerate(synthetic_posts(n), 1):
+        post = dict(classify_enhanced(text), text=text, source="api", author=f"user{rng.randrange(1000)}",
+                    platform=rng.choice(["Twitter", "Reddit"]), timestamp="2025-09-01T12:00:00Z", seq=seq)
+        posts.append(post)
+
+    encoders = {"json.dumps": (lambda p: json.dumps(p, ensure_ascii=False, separators=(",", ":")), json.loads),
+                "stdlib encoder": (_json_encode, json.loads), "encode_json": (encode_json, json.loads)}
+    if "msgpack" in CODECS:
+        import msgpack
+        encoders["msgpack"] = (CODECS["msgpack"].encode, msgpack.unpackb)
+    else:
+        print("frames: msgpack not installed, skipping it")
+    ok = True
+    for name, (encode, decode) in encoders.items():
+        start = time.perf_counter()
+        encoded = [encode(p) for p in posts]
+        elapsed = time.perf_counter() - start
+        same = [decode(e) for e in encoded] == posts
+        ok = ok and same
+        raw = b"".join(e if isinstance(e, bytes) else e.encode("utf-8") for e in encoded)
+        # One zlib stream approximates permessage-deflate with context takeover
+        print(f"frames {name}: {n / elapsed:,.0f} posts/s, {len(raw) / n:.0f} B/post, "
+              f"{len(zlib.compress(raw)) / n:.0f} B/post deflated, round trip {'ok' if same else 'MISMATCH'}")
+    return ok
+
+
+def bench_log(n: int) -> bool:
+    """Append n posts to an IngestLog with batched fsyncs vs. one fsync per post, then read them back."""
+    from ingest_log import IngestLog
+
+    posts = [{"text": text, "source": "api", "timestamp": "2025-09-01T12:00:00Z"} for text in synthetic_posts(n)]
+    per_post = posts[:min(n, 2000)]
+    with tempfile.TemporaryDirectory() as tmp:
+        log = IngestLog(os.path.join(tmp, "batched"), segment_bytes=4 * 1024 * 1024)
+        start = time.perf_counter()
+        for i in range(0, n, 100):
+            log.append(posts[i:i + 100])
+            if i % 1000 == 0:
+                log.sync()  # about what the bridge's 100 ms syncer does under load
+        log.sync()
+        batched_s = time.perf_counter() - start
+
+        single = IngestLog(os.path.join(tmp, "single"))
+        start = time.perf_counter()
+        for post in per_post:
+            single.append([post])
+            single.sync()
+        single_s = time.perf_counter() - start
+        single.close()
+
+        start = time.perf_counter()
+        got, offset = [], 0
+        while offset < n:
+            chunk = log.read(offset, 1000)
+            got.extend(record for _, record in chunk)
+            offset = chunk[-1][0] + 1
+        read_s = time.perf_counter() - start
+        middle = time.perf_counter()
+        log.read(n // 2, 1)
+        seek_ms = (time.perf_counter() - middle) * 1000
+        segments = log.stats()["segments"]
+        log.close()
+
+    same = got == posts
+    print(f"log parity: {'identical' if same else 'MISMATCH'} over {n} posts in {segments} segments")
+    print(f"log append: batched fsync {n / batched_s:,.0f} posts/s, "
+          f"fsync per post {len(per_post) / single_s:,.0f} posts/s")
+    print(f"log read: {n / read_s:,.0f} posts/s sequential, {seek_ms:.2f} ms to a middle offset")
+    return same
+
+
+def _fanout_clients(port: int, clients: int, n: int, results):
+    """One load-test process: `clients` /stream connections, each reading until it has n posts."""
+    import asyncio
+    import hashlib
+    import json
+    import websockets
+
+    async def client():
+        async with websockets.connect(f"ws://127.0.0.1:{port}/stream", max_size=None, compression=None) as ws:
+            results.put("ready")
+            seqs: List[int] = []
+            while len(seqs) < n:
+                frame = json.loads(await asyncio.wait_for(ws.recv(), 60))
+                seqs.extend(post["seq"] for post in frame.get("items", [frame]))
+            return time.time(), hashlib.blake2b(repr(seqs).encode()).hexdigest(), len(seqs)
+
+    async def main():
+        for outcome in await asyncio.gather(*(client() for _ in range(clients)), return_exceptions=True):
+            results.put(outcome if isinstance(outcome, tuple) else (time.time(), repr(outcome), 0))
+
+    asyncio.run(main())
+
+
+def _bench_hub_delivery(n: int) -> bool:
+    """
+    What every worker does per hub delivery, which bounds how far workers scale: parse the
+    JSON array and serialize each post again (the old frame) vs. splice seqs into the
+    serialized posts.
+    """
+    import asyncio
+    import json
+    from bridge import Manager, encode_json, route_keys
+    from pipeline import enrich_posts
+    from pubsub import decode_batch, encode_batch
+
+    posts = enrich_posts([{"text": text, "source": "api"} for text in synthetic_posts(n)])
+    texts = [encode_json(post) for post in posts]
+    array_payload = ("[" + ",".join(texts) + "]").encode("utf-8")
+    batch_payload = encode_batch(texts, [route_keys(post) for post in posts])
+
+    legacy, spliced = Manager(), Manager()
+    start = time.perf_counter()
+    asyncio.run(legacy.publish(json.loads(array_payload)))
+    legacy_s = time.perf_counter() - start
+    start = time.perf_counter()
+    spliced.deliver(1, *decode_batch(batch_payload, len(posts)))
+    spliced_s = time.perf_counter() - start
+
+    def replayed(manager):
+        return [json.loads(text) for text in manager.replay_buffer.since(0)]
+    same = replayed(legacy) == replayed(spliced)
+    print(f"fanout hub delivery per worker: parse + re-encode {n / legacy_s:,.0f} posts/s, "
+          f"splice {n / spliced_s:,.0f} posts/s ({legacy_s / spliced_s:.1f}x), "
+          f"{'identical' if same else 'MISMATCH'}")
+    return same
+
+
+def bench_fanout(n: int) -> bool:
+    """
+    Load test: start `python bridge.py` with 1, 2 and 4 uvicorn workers, connect 8 clients
+    from 4 processes and ingest n posts in /ingest/batch requests of 500. Reports posts
+    delivered per second over all clients; every client must receive the same n seqs.
+    Scaling needs spare cores for the workers and the load generator.
+    """
+    import json
+    import multiprocessing
+    import subprocess
+    import requests
+
+    ok = _bench_hub_delivery(min(n, 20_000))
+    n = min(n, 50_000)
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    baseline = None
+    print(f"fanout: {os.cpu_count()} CPUs, {n} posts, 8 clients")
+    for workers in (1, 2, 4):
+        port = 8700 + workers
+        env = dict(os.environ, HARMWATCH_UVICORN_WORKERS=str(workers), HARMWATCH_BRIDGE_PORT=str(port),
+                   HARMWATCH_BRIDGE_WORKERS="0", HARMWATCH_WS_DEFLATE="0", HARMWATCH_INGEST_LOG="")
+        bridge = subprocess.Popen([sys.executable, "bridge.py"], cwd=app_dir, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        procs = []
+        try:
+            for _ in range(100):
+                try:
+                    requests.get(f"http://127.0.0.1:{port}/health", timeout=1)
+                    break
+                except requests.RequestException:
+                    time.sleep(0.2)
+            results = multiprocessing.Queue()
+            procs = [multiprocessing.Process(target=_fanout_clients, args=(port, 2, n, results)) for _ in range(4)]
+            for proc in procs:
+                proc.start()
+            for _ in range(8):
+                results.get(timeout=60)
+            time.sleep(0.5)  # let every worker finish accepting
+
+            start = time.time()
+            for i in range(0, n, 500):
+                body = "\n".join(json.dumps({"text": f"load test post {j} {TRIGGERS[j % len(TRIGGERS)]}"})
+                                 for j in range(i, min(n, i + 500)))
+                requests.post(f"http://127.0.0.1:{port}/ingest/batch", data=body, timeout=60)
+            outcomes = [results.get(timeout=120) for _ in range(8)]
+            elapsed = max(end for end, _, _ in outcomes) - start
+        finally:
+            for proc in procs:
+                proc.join(timeout=10)
+            bridge.terminate()
+            bridge.wait(timeout=30)
+
+        same = len({digest for _, digest, _ in outcomes}) == 1 and all(count == n for _, _, count in outcomes)
+        ok = ok and same
+        rate = 8 * n / elapsed
+        baseline = baseline or rate
+        print(f"fanout {workers} worker(s): {rate:,.0f} posts delivered/s ({rate / baseline:.2f}x), "
+              f"{n / elapsed:,.0f} posts ingested/s, clients {'consistent' if same else 'INCONSISTENT'}")
+    return ok
+
+
+BENCHMARKS = {
+    "classify": bench_classify,
+    "batch": bench_batch,
+    "backtrack": bench_backtrack,
+    "clean": bench_clean,
+    "hash": bench_hash,
+    "domains": bench_domains,
+    "storage": bench_storage,
+    "cache": bench_cache,
+    "rules": bench_rules,
+    "lexicon": bench_lexicon,
+    "routing": bench_routing,
+    "frames": bench_frames,
+    "log": bench_log,
+    "fanout": bench_fanout,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HarmWatch benchmarks")
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument("-n", type=int, default=100_000, help="number of synthetic posts")
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    ok = True
+    for name in args.names or BENCHMARKS:
+        print(f"== {name}")
+        ok = BENCHMARKS[name](args.n) and ok
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,228 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Set, Dict, Any
-import asyncio, datetime
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from typing import Callable, Dict, Any, FrozenSet, List, Optional, Set, Tuple
+from collections import deque
+from itertools import islice
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import asynccontextmanager, suppress
+import asyncio, datetime, json, logging, os, time
 
-app = FastAPI(title="HarmWatch Bridge", version="1.0.0")
+from dedup import SeenSet, content_hash
+from ingest_log import IngestLog, open_ingest_log, partition_dir, read_log
+from pipeline import enrich_posts
+from preprocess import extract_domains
+from pubsub import HubClient
+
+try:  # optional: binary /stream frames
+    import msgpack
+except ImportError:
+    msgpack = None
+try:  # optional: faster JSON serialization
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Posts waiting for the broadcaster; when full, "drop-oldest" discards the oldest
+# queued post and "reject" answers 429 so producers back off and retry
+QUEUE_SIZE = int(os.getenv("HARMWATCH_QUEUE_SIZE", "10000"))
+QUEUE_POLICY = os.getenv("HARMWATCH_QUEUE_POLICY", "drop-oldest")
+QUEUE_POLICIES = ("drop-oldest", "reject")
+# Largest /ingest/batch request accepted (items)
+MAX_BATCH_ITEMS = int(os.getenv("HARMWATCH_MAX_BATCH_ITEMS", "10000"))
+# Processes that preprocess + classify queued posts (0 = a thread in this process)
+CLASSIFY_WORKERS = int(os.getenv("HARMWATCH_BRIDGE_WORKERS", "1"))
+# With HARMWATCH_INGEST_LOG set, accepted posts are fsynced in batches this often (ms);
+# 0 fsyncs before /ingest answers
+INGEST_LOG_FSYNC_MS = int(os.getenv("HARMWATCH_INGEST_LOG_FSYNC_MS", "100"))
+# With several uvicorn workers, every worker publishes through a pub/sub hub on this
+# Unix socket (see pubsub.py); `python bridge.py` sets it up
+UVICORN_WORKERS = int(os.getenv("HARMWATCH_UVICORN_WORKERS", "1"))
+HUB_SOCKET = os.getenv("HARMWATCH_HUB_SOCKET")
+
+class IngestQueue:
+    """
+    Bounded hand-off between /ingest and the background broadcaster, sized in posts.
+    Each entry is the list of posts from one request; counters count posts.
+    """
+
+    def __init__(self, maxsize: int, policy: str):
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f"Unknown queue policy {policy!r}; use one of {', '.join(QUEUE_POLICIES)}")
+        self.policy = policy
+        self.maxsize = maxsize
+        self.batches: deque = deque()
+        self.depth = 0  # queued posts
+        self.ready = asyncio.Event()
+        self.counters = {"enqueued": 0, "broadcast": 0, "dropped": 0, "rejected": 0}
+        self.high_water = 0
+
+    def admit(self, count: int = 1) -> bool:
+        """False (and counted) if the reject policy has no room for `count` more posts."""
+        if self.policy == "reject" and self.depth + count > self.maxsize:
+            self.counters["rejected"] += count
+            return False
+        return True
+
+    def put(self, posts: List[Dict[str, Any]]):
+        """Queue one request's posts; past maxsize the oldest queued posts are dropped."""
+        self.batches.append(posts)
+        self.depth += len(posts)
+        self.counters["enqueued"] += len(posts)
+        while self.depth > self.maxsize:
+            oldest, excess = self.batches[0], self.depth - self.maxsize
+            if len(oldest) <= excess:
+                self.batches.popleft()
+                excess = len(oldest)
+            else:
+                del oldest[:excess]
+            self.depth -= excess
+            self.counters["dropped"] += excess
+        self.high_water = max(self.high_water, self.depth)
+        self.ready.set()
+
+    async def get(self) -> List[Dict[str, Any]]:
+        """The oldest queued request's posts (single consumer: the classifier)."""
+        while not self.batches:
+            self.ready.clear()
+            await self.ready.wait()
+        posts = self.batches.popleft()
+        self.depth -= len(posts)
+        return posts
+
+    def stats(self) -> Dict[str, Any]:
+        return {"depth": self.depth, "maxsize": self.maxsize, "policy": self.policy,
+                "high_water": self.high_water, **self.counters}
+
+class Classifier:
+    """
+    Enriches queued posts (pipeline.enrich_posts) off the event loop. Up to `in_flight`
+    requests are classified concurrently; results are published in arrival order.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.executor: Optional[Executor] = None
+        self.pending: asyncio.Queue = asyncio.Queue(max(1, workers) * 2)
+        self.counters = {"classified": 0, "errors": 0}
+
+    def start(self):
+        # None runs enrich_posts on the loop's default thread pool
+        self.executor = ProcessPoolExecutor(self.workers) if self.workers > 0 else None
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def submit_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            posts = await ingest_queue.get()
+            await self.pending.put((posts, loop.run_in_executor(self.executor, enrich_posts, posts)))
+
+    async def next_batch(self) -> List[Dict[str, Any]]:
+        posts, future = await self.pending.get()
+        try:
+            enriched = await future
+        except Exception:
+            # Dashboards fall back to classifying raw posts themselves
+            self.counters["errors"] += 1
+            logger.exception("Classification failed; broadcasting %d raw posts", len(posts))
+            return posts
+        self.counters["classified"] += len(enriched)
+        return enriched
+
+    def stats(self) -> Dict[str, Any]:
+        return {"workers": self.workers, "in_flight": self.pending.qsize(), **self.counters}
+
+classifier = Classifier(CLASSIFY_WORKERS)
+
+async def broadcaster():
+    """
+    Publish classified posts to the WebSocket clients, one request's posts at a time;
+    with a hub, to the clients of every worker (delivered by hub_listener).
+    """
+    while True:
+        posts = await classifier.next_batch()
+        try:
+            if hub is None:
+                await manager.publish(posts)
+            elif not hub.publish([encode_json(post) for post in posts], [route_keys(post) for post in posts]):
+                # Only the hub hands out seqs, so these must not take one: they would
+                # collide with the hub's and be skipped by clients as already seen
+                logger.warning("Pub/sub hub unavailable; %d posts reach this worker's clients only, "
+                               "without a seq", len(posts))
+                await manager.publish(posts, numbered=False)
+            ingest_queue.counters["broadcast"] += len(posts)
+        except Exception:
+            logger.exception("Broadcast failed")
+
+async def hub_listener():
+    """Deliver every worker's posts, numbered by the hub, to this worker's clients."""
+    async for first_seq, texts, keys in hub.deliveries():
+        try:
+            manager.deliver(first_seq, texts, keys)
+        except Exception:
+            logger.exception("Broadcast failed")
+
+async def log_syncer():
+    """Batch the ingest log's fsyncs, segment rolls and retention; runs in a thread so the loop keeps serving."""
+    while True:
+        await asyncio.sleep(INGEST_LOG_FSYNC_MS / 1000)
+        try:
+            await asyncio.to_thread(ingest_log.sync)
+        except Exception:
+            logger.exception("Ingest log sync failed")
+
+def recover_from_log():
+    """
+    Remember the newest logged posts for dedup after a restart, so reposts are still
+    recognised, and re-broadcast them so the replay buffer is warm. With a pub/sub hub
+    they are not re-broadcast: they would reach every worker's clients again under new
+    seqs, and the other workers' replay buffers still hold them.
+    """
+    start = max(ingest_log.start_offset, ingest_log.next_offset - REPLAY_SIZE)
+    posts = [dict(record, log_offset=offset) for offset, record in ingest_log.read(start, REPLAY_SIZE)]
+    for post in posts:
+        seen.check_and_add(repost_key(post.get("text") or ""))
+    if not posts:
+        return
+    if hub is None:
+        ingest_queue.put(posts)
+        logger.info("Recovered %d posts from the ingest log", len(posts))
+    else:
+        logger.info("Recovered %d posts from the ingest log for dedup only", len(posts))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global ingest_log
+    classifier.start()
+    tasks = [asyncio.create_task(classifier.submit_loop()), asyncio.create_task(broadcaster())]
+    if hub is not None:
+        tasks.append(asyncio.create_task(hub_listener()))
+        if not await hub.wait_connected(timeout=5):
+            logger.warning("Pub/sub hub not reachable at %s yet; publishing locally without seqs", hub.path)
+    # Opened here rather than at import so a multi-worker launcher never holds a partition
+    ingest_log = open_ingest_log(partitioned=hub is not None)
+    if ingest_log is not None:
+        if REPLAY_SIZE > 0:
+            recover_from_log()
+        if INGEST_LOG_FSYNC_MS > 0:
+            tasks.append(asyncio.create_task(log_syncer()))
+    yield
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        with suppress(asyncio.CancelledError):
+            await task
+    classifier.shutdown()
+    if ingest_log is not None:
+        ingest_log.close()
+
+app = FastAPI(title="HarmWatch Bridge", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -22,54 +240,667 @@ class IngestItem(BaseModel):
     platform: str | None = None
     url: str | None = None
 
-class Manager:
+# Each client has an outbound queue of at most CLIENT_MAX_LAG messages. With "coalesce" any
+# backlog goes out as batch frames and, once the queue is full, its oldest messages are
+# dropped; with "disconnect" a client whose queue fills is closed (code 1013, try again later).
+CLIENT_MAX_LAG = int(os.getenv("HARMWATCH_CLIENT_MAX_LAG", "1000"))
+SLOW_CLIENT_POLICY = os.getenv("HARMWATCH_SLOW_CLIENT_POLICY", "coalesce")
+SLOW_CLIENT_POLICIES = ("coalesce", "disconnect")
+MAX_BATCH_FRAME = 500
+
+def batch_frame(texts: List[str]) -> str:
+    """{"type": "batch", "items": [...]} built from already-serialized posts."""
+    return '{"type":"batch","items":[' + ",".join(texts) + "]}"
+
+# A reusable encoder skips the per-call setup json.dumps does for non-default options
+_json_encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+def encode_json(post: Dict[str, Any]) -> str:
+    """Compact JSON for one post, via orjson when it is installed."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(post).decode("utf-8")
+        except TypeError:
+            pass  # e.g. non-string keys; the standard encoder handles those
+    return _json_encode(post)
+
+class JsonCodec:
+    """
+    Text frames: a post is its JSON object, several posts a batch_frame. Fragments
+    (one or more encoded posts) are comma-joined so a backlog is framed without re-encoding.
+    """
+    name = "json"
+    binary = False
+
+    def encode(self, post: Dict[str, Any]) -> str:
+        return encode_json(post)
+
+    def from_json(self, text: str) -> str:
+        return text
+
+    def join(self, parts: List[str]) -> str:
+        return ",".join(parts)
+
+    def frame(self, fragment: str, count: int) -> str:
+        return fragment if count == 1 else batch_frame([fragment])
+
+class MsgpackCodec:
+    """
+    Binary frames in MessagePack with the same shapes as JSON. Encoded posts are simply
+    concatenated: a batch frame is a map header, "items" and an array header in front of them.
+    """
+    name = "msgpack"
+    binary = True
+
+    def __init__(self):
+        self._batch_prefix = b"\x82" + msgpack.packb("type") + msgpack.packb("batch") + msgpack.packb("items")
+
+    def encode(self, post: Dict[str, Any]) -> bytes:
+        return msgpack.packb(post, use_bin_type=True)
+
+    def from_json(self, text: str) -> bytes:
+        return self.encode(json.loads(text))
+
+    def join(self, parts: List[bytes]) -> bytes:
+        return b"".join(parts)
+
+    def frame(self, fragment: bytes, count: int) -> bytes:
+        if count == 1:
+            return fragment
+        if count < 16:
+            header = bytes([0x90 | count])
+        elif count < 0x10000:
+            header = b"\xdc" + count.to_bytes(2, "big")
+        else:
+            header = b"\xdd" + count.to_bytes(4, "big")
+        return self._batch_prefix + header + fragment
+
+JSON_CODEC = JsonCodec()
+# Encodings a client can ask for, by WebSocket subprotocol or /stream?encoding=
+CODECS: Dict[str, Any] = {"json": JSON_CODEC}
+if msgpack is not None:
+    CODECS["msgpack"] = MsgpackCodec()
+SUBPROTOCOL_PREFIX = "harmwatch."
+
+def negotiate(ws: WebSocket) -> Tuple[Any, Optional[str]]:
+    """
+    (codec, subprotocol to accept): the first offered "harmwatch.<encoding>" subprotocol
+    this bridge supports, else the ?encoding= query parameter, else JSON. Asking for
+    msgpack when it is not installed gets JSON, so clients must check the frame type.
+    """
+    for offered in ws.scope.get("subprotocols") or ():
+        if offered.startswith(SUBPROTOCOL_PREFIX) and offered[len(SUBPROTOCOL_PREFIX):] in CODECS:
+            return CODECS[offered[len(SUBPROTOCOL_PREFIX):]], offered
+    return CODECS.get(ws.query_params.get("encoding", "json"), JSON_CODEC), None
+
+# Recent broadcasts kept for replay to new subscribers: at most REPLAY_SIZE posts and
+# about REPLAY_MAX_BYTES of serialized JSON, whichever limit is reached first
+REPLAY_SIZE = int(os.getenv("HARMWATCH_REPLAY_SIZE", "1000"))
+REPLAY_MAX_BYTES = int(os.getenv("HARMWATCH_REPLAY_MAX_BYTES", str(8 * 1024 * 1024)))
+
+class ReplayBuffer:
+    """
+    Ring buffer of (seq, broadcast time, serialized post, route keys) for every published post.
+    Sequence numbers are consecutive, so a replay from a seq is a slice, not a scan.
+    Sizes are counted in characters of JSON, which is bytes for ASCII posts.
+    """
+
+    def __init__(self, maxlen: int = REPLAY_SIZE, max_bytes: int = REPLAY_MAX_BYTES):
+        self.maxlen = maxlen
+        self.max_bytes = max_bytes
+        self.entries: deque = deque()
+        self.bytes = 0
+        self.last_seq = 0
+        self.evicted = 0
+
+    def append(self, seq: int, text: str, keys: "RouteKeys" = ()):
+        self.last_seq = seq
+        if self.maxlen <= 0:
+            return
+        self.entries.append((seq, time.time(), text, keys))
+        self.bytes += len(text)
+        while self.entries and (len(self.entries) > self.maxlen or self.bytes > self.max_bytes):
+            self.bytes -= len(self.entries.popleft()[2])
+            self.evicted += 1
+
+    def since(self, seq: Optional[int] = None, ts: Optional[float] = None, last: Optional[int] = None,
+              subscription: Optional["Subscription"] = None) -> List[str]:
+        """
+        Serialized posts with seq > `seq`, broadcast at or after `ts` and matching
+        `subscription`, at most the `last` newest.
+        """
+        entries = self.entries
+        if seq is not None and entries:
+            if entries[-1][0] - entries[0][0] == len(entries) - 1:
+                skip = min(max(0, seq - entries[0][0] + 1), len(entries))
+                entries = list(islice(entries, skip, None))
+            else:
+                # A gap (a worker reconnecting to the hub misses posts); fall back to a scan
+                entries = [e for e in entries if e[0] > seq]
+        if ts is not None:
+            entries = [e for e in entries if e[1] >= ts]
+        if subscription is not None:
+            entries = [e for e in entries if subscription.matches(e[3])]
+        texts = [e[2] for e in entries]
+        if last is not None:
+            return texts[-last:] if last > 0 else []  # texts[-0:] would be all of them
+        return texts
+
+    def stats(self) -> Dict[str, Any]:
+        return {"size": len(self.entries), "bytes": self.bytes, "maxlen": self.maxlen,
+                "max_bytes": self.max_bytes, "first_seq": self.entries[0][0] if self.entries else None,
+                "last_seq": self.last_seq, "evicted": self.evicted}
+
+def parse_since(value: Any) -> Optional[float]:
+    """Replay start time as epoch seconds: a number, or an ISO 8601 string ("...Z" allowed)."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except ValueError:
+        when = datetime.datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=datetime.timezone.utc)
+        return when.timestamp()
+
+# Clients may subscribe to part of the stream. Each field a subscription constrains
+# lists the values it accepts; a post matches when every constrained field has one.
+FILTER_FIELDS = ("risk_level", "labels", "platform", "source")
+RISK_LEVELS = ("low", "medium", "high")
+# One tuple of values per FILTER_FIELDS entry (several for labels)
+RouteKeys = Tuple[Tuple[str, ...], ...]
+
+def route_keys(post: Dict[str, Any]) -> RouteKeys:
+    """The values of a post that subscriptions filter on; platform and source are case-insensitive."""
+    level = post.get("risk_level")
+    platform, source = post.get("platform"), post.get("source")
+    return ((level,) if level else (), tuple(post.get("labels") or ()),
+            (platform.lower(),) if platform else (), (source.lower(),) if source else ())
+
+class Subscription:
+    """
+    Accepted values per filter field (None accepts anything). min_risk keeps that risk
+    level and above; labels matches posts carrying any of the given labels.
+    """
+
+    def __init__(self, min_risk: Optional[str] = None, labels: Optional[List[str]] = None,
+                 platforms: Optional[List[str]] = None, sources: Optional[List[str]] = None):
+        if min_risk is not None and min_risk not in RISK_LEVELS:
+            raise ValueError(f"Unknown risk level {min_risk!r}; use one of {', '.join(RISK_LEVELS)}")
+        levels = RISK_LEVELS[RISK_LEVELS.index(min_risk):] if min_risk else None
+        self.min_risk = min_risk
+        self.fields: Tuple[Optional[FrozenSet[str]], ...] = (
+            frozenset(levels) if levels else None,
+            frozenset(labels) if labels else None,
+            frozenset(p.lower() for p in platforms) if platforms else None,
+            frozenset(s.lower() for s in sources) if sources else None,
+        )
+
+    @classmethod
+    def from_params(cls, params: Dict[str, Any]) -> Optional["Subscription"]:
+        """
+        Build from query parameters or a {"type": "subscribe", ...} message; lists may be
+        JSON arrays or comma-separated strings. None when nothing is filtered.
+        """
+        def values(name: str) -> List[str]:
+            value = params.get(name)
+            if isinstance(value, str):
+                value = value.split(",")
+            return [str(v).strip() for v in value or () if str(v).strip()]
+
+        sub = cls(params.get("min_risk") or None, values("labels"), values("platforms"), values("sources"))
+        return sub if any(f is not None for f in sub.fields) else None
+
+    def matches(self, keys: RouteKeys) -> bool:
+        return all(allowed is None or not allowed.isdisjoint(values)
+                   for allowed, values in zip(self.fields, keys))
+
+    def to_dict(self) -> Dict[str, Any]:
+        names = ("labels", "platforms", "sources")
+        return {"min_risk": self.min_risk,
+                **{name: sorted(f) for name, f in zip(names, self.fields[1:]) if f is not None}}
+
+class SubscriptionIndex:
+    """
+    Inverted index from (field, value) to the subscribed clients accepting it, so routing
+    a post costs a few set operations per field instead of a filter check per client.
+    """
+
     def __init__(self):
-        self.clients: Set[WebSocket] = set()
-        self.lock = asyncio.Lock()
+        self.by_value: List[Dict[str, Set["Client"]]] = [{} for _ in FILTER_FIELDS]
+        # Per field, the clients that do not constrain it
+        self.unconstrained: List[Set["Client"]] = [set() for _ in FILTER_FIELDS]
+        self.clients: Set["Client"] = set()
+
+    def __len__(self) -> int:
+        return len(self.clients)
+
+    def add(self, client: "Client", sub: Subscription):
+        self.clients.add(client)
+        for i, allowed in enumerate(sub.fields):
+            if allowed is None:
+                self.unconstrained[i].add(client)
+            for value in allowed or ():
+                self.by_value[i].setdefault(value, set()).add(client)
+
+    def remove(self, client: "Client", sub: Subscription):
+        self.clients.discard(client)
+        for i, allowed in enumerate(sub.fields):
+            self.unconstrained[i].discard(client)
+            for value in allowed or ():
+                subscribers = self.by_value[i].get(value)
+                if subscribers is not None:
+                    subscribers.discard(client)
+                    if not subscribers:
+                        del self.by_value[i][value]
+
+    def route(self, keys: RouteKeys) -> Set["Client"]:
+        """Subscribed clients whose subscription matches a post with these route keys."""
+        matched: Optional[Set["Client"]] = None
+        for i, values in enumerate(keys):
+            accepted = set(self.unconstrained[i])
+            for value in values:
+                accepted.update(self.by_value[i].get(value, ()))
+            matched = accepted if matched is None else matched & accepted
+            if not matched:
+                break
+        return matched or set()
+
+class Client:
+    """One WebSocket connection with its own outbound queue and writer task."""
+
+    def __init__(self, ws: WebSocket, manager: "Manager", codec: Any = JSON_CODEC):
+        self.ws = ws
+        self.manager = manager
+        self.codec = codec
+        self.queue: asyncio.Queue = asyncio.Queue(manager.max_lag)
+        self.subscription: Optional[Subscription] = None  # None receives everything
+        self.task = asyncio.create_task(self.writer())
+
+    def offer(self, entry: Tuple[str, int]) -> bool:
+        """
+        Queue (fragment of encoded posts, count) without blocking; False if the client is too
+        slow to keep. Fragments are in the client's encoding (see JsonCodec).
+        """
+        if self.queue.full():
+            if self.manager.policy == "disconnect":
+                return False
+            self.manager.counters["dropped_messages"] += self.queue.get_nowait()[1]
+        self.queue.put_nowait(entry)
+        return True
+
+    async def writer(self):
+        try:
+            while True:
+                fragment, count = await self.queue.get()
+                if self.manager.policy == "coalesce" and not self.queue.empty():
+                    parts = [fragment]
+                    while not self.queue.empty() and count < MAX_BATCH_FRAME:
+                        more, n = self.queue.get_nowait()
+                        parts.append(more)
+                        count += n
+                    self.manager.counters["coalesced_frames"] += 1
+                    fragment = self.codec.join(parts)
+                # One post goes out as a plain object, anything more as a batch frame
+                frame = self.codec.frame(fragment, count)
+                if self.codec.binary:
+                    await self.ws.send_bytes(frame)
+                else:
+                    await self.ws.send_text(frame)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Send failed: the socket is gone
+            self.manager.drop(self)
+
+    async def close(self, code: int = 1000):
+        self.task.cancel()
+        with suppress(Exception):
+            await self.ws.close(code=code)
+
+class Manager:
+    def __init__(self, max_lag: int = CLIENT_MAX_LAG, policy: str = SLOW_CLIENT_POLICY,
+                 replay: Optional[ReplayBuffer] = None):
+        if policy not in SLOW_CLIENT_POLICIES:
+            raise ValueError(f"Unknown slow-client policy {policy!r}; use one of {', '.join(SLOW_CLIENT_POLICIES)}")
+        self.max_lag = max_lag
+        self.policy = policy
+        self.clients: Dict[WebSocket, Client] = {}
+        self.replay_buffer = replay if replay is not None else ReplayBuffer()
+        self.index = SubscriptionIndex()
+        self.counters = {"slow_disconnects": 0, "coalesced_frames": 0, "dropped_messages": 0, "replays": 0,
+                         "filtered_messages": 0}
 
-    async def connect(self, ws: WebSocket):
-        await ws.accept()
-        async with self.lock:
-            self.clients.add(ws)
+    async def connect(self, ws: WebSocket) -> Client:
+        codec, subprotocol = negotiate(ws)
+        await ws.accept(subprotocol=subprotocol)
+        client = self.clients[ws] = Client(ws, self, codec)
+        return client
 
     async def disconnect(self, ws: WebSocket):
-        async with self.lock:
-            self.clients.discard(ws)
+        client = self.clients.pop(ws, None)
+        if client is not None:
+            self.subscribe(client, None)
+            client.task.cancel()
+
+    def drop(self, client: Client):
+        if self.clients.get(client.ws) is client:
+            del self.clients[client.ws]
+            self.subscribe(client, None)
+
+    def subscribe(self, client: Client, sub: Optional[Subscription]):
+        """Replace a client's subscription (None: receive everything)."""
+        if client.subscription is not None:
+            self.index.remove(client, client.subscription)
+        client.subscription = sub
+        if sub is not None:
+            self.index.add(client, sub)
 
     async def broadcast(self, msg: Dict[str, Any]):
-        dead = []
-        async with self.lock:
-            for ws in self.clients:
-                try:
-                    await ws.send_json(msg)
-                except Exception:
-                    dead.append(ws)
-            for ws in dead:
-                self.clients.discard(ws)
+        await self.publish([msg])
+
+    async def publish(self, posts: List[Dict[str, Any]], numbered: bool = True):
+        """
+        Number posts (a "seq" field, continuing from the last one), serialize them once per
+        encoding in use, keep them for replay and hand them to the queue of every client
+        subscribed to them; never waits on a socket. With numbered=False (a worker cut off
+        from the pub/sub hub, which hands out the seqs) posts get no seq and are not kept.
+        """
+        if not posts:
+            return
+        texts, keys = [], [route_keys(post) for post in posts]
+        seq = self.replay_buffer.last_seq
+        for post, key in zip(posts, keys):
+            if numbered:
+                seq += 1
+                post["seq"] = seq
+            texts.append(encode_json(post))
+            if numbered:
+                self.replay_buffer.append(seq, texts[-1], key)
+        self._fan_out(texts, keys, lambda codec: [codec.encode(post) for post in posts])
+
+    def deliver(self, first_seq: int, fragments: List[str], keys: List[RouteKeys]):
+        """
+        publish() for a batch from the pub/sub hub: each post's JSON (sent without a seq) gets
+        the seq the hub gave it spliced in, instead of being parsed and serialized again.
+        """
+        texts = []
+        for seq, fragment, key in zip(range(first_seq, first_seq + len(fragments)), fragments, keys):
+            text = f'{{"seq":{seq},{fragment[1:]}' if fragment != "{}" else f'{{"seq":{seq}}}'
+            self.replay_buffer.append(seq, text, key)
+            texts.append(text)
+        # Encodings other than JSON are made from the JSON, and only if a client uses them
+        self._fan_out(texts, keys, lambda codec: [codec.from_json(text) for text in texts])
+
+    def _fan_out(self, texts: List[str], keys: List[RouteKeys], encode: Callable[[Any], List[Any]]):
+        """Queue serialized posts to every client subscribed to them; encode(codec) makes other encodings."""
+        if not texts:
+            return
+        encoded: Dict[str, List[Any]] = {JSON_CODEC.name: texts}
+
+        def encoded_for(codec) -> List[Any]:
+            if codec.name not in encoded:
+                encoded[codec.name] = encode(codec)
+            return encoded[codec.name]
+
+        entries: Dict[str, Tuple[Any, int]] = {}
+        for client in [c for c in self.clients.values() if c.subscription is None]:
+            codec = client.codec
+            if codec.name not in entries:
+                entries[codec.name] = (codec.join(encoded_for(codec)), len(texts))
+            self._offer(client, entries[codec.name])
+        if not self.index:
+            return
+        # Posts usually share a few (risk, labels, platform, source) combinations
+        routes: Dict[RouteKeys, Set[Client]] = {}
+        selected: Dict[Client, List[int]] = {}
+        for i, key in enumerate(keys):
+            matched = routes.get(key)
+            if matched is None:
+                matched = routes[key] = self.index.route(key)
+            self.counters["filtered_messages"] += len(self.index) - len(matched)
+            for client in matched:
+                selected.setdefault(client, []).append(i)
+        for client, chosen in selected.items():
+            items = encoded_for(client.codec)
+            self._offer(client, (client.codec.join([items[i] for i in chosen]), len(chosen)))
+
+    def _offer(self, client: Client, entry: Tuple[str, int]):
+        if not client.offer(entry) and self.clients.get(client.ws) is client:
+            self.drop(client)
+            self.counters["slow_disconnects"] += 1
+            asyncio.create_task(client.close(code=1013))
+
+    def replay(self, client: Client, seq: Optional[int] = None, ts: Optional[float] = None,
+               last: Optional[int] = None) -> int:
+        """
+        Queue buffered posts matching the request to one client as a single frame (a batch
+        frame unless it is one post). Live posts published afterwards follow it in order.
+        A replay requested by message can repeat posts the client already received, so
+        clients skip any seq they already have.
+        """
+        texts = self.replay_buffer.since(seq, ts, last, client.subscription)
+        if texts:
+            self.counters["replays"] += 1
+            codec = client.codec
+            client.offer((codec.join([codec.from_json(text) for text in texts]), len(texts)))
+        return len(texts)
+
+    def stats(self) -> Dict[str, Any]:
+        lags = [client.queue.qsize() for client in self.clients.values()]
+        encodings: Dict[str, int] = {}
+        for client in self.clients.values():
+            encodings[client.codec.name] = encodings.get(client.codec.name, 0) + 1
+        return {"policy": self.policy, "max_lag": self.max_lag, "max_client_lag": max(lags, default=0),
+                "subscribed_clients": len(self.index), "encodings": encodings, **self.counters}
 
 manager = Manager()
+# Recent post fingerprints, to count exact reposts inside the window. Reposts are still
+# logged and broadcast; their classification comes from the classification cache.
+seen = SeenSet(int(os.getenv("HARMWATCH_DEDUP_WINDOW", "100000")))
+ingest_queue = IngestQueue(QUEUE_SIZE, QUEUE_POLICY)
+# Durable record of accepted posts (None unless HARMWATCH_INGEST_LOG is set); one
+# partition per worker process when there are several
+ingest_log: Optional[IngestLog] = None
+hub = HubClient(HUB_SOCKET) if HUB_SOCKET else None
+
+def repost_key(text: str) -> Optional[str]:
+    """Dedup key of a raw post: the text and domains the bridge classifies (see enrich_posts)."""
+    return content_hash(text, extract_domains(text))
+
+def log_posts(posts: List[Dict[str, Any]]):
+    """Append accepted posts to the ingest log, if enabled, and stamp their log_offset."""
+    if ingest_log is None:
+        return
+    first = ingest_log.append(posts)
+    for i, post in enumerate(posts):
+        post["log_offset"] = first + i
+        if ingest_log.partition is not None:
+            post["log_partition"] = ingest_log.partition
+
+async def sync_log():
+    """With HARMWATCH_INGEST_LOG_FSYNC_MS=0, fsync the log before /ingest answers."""
+    if ingest_log is not None and INGEST_LOG_FSYNC_MS <= 0:
+        await asyncio.to_thread(ingest_log.sync)
+
+def replay_request(params: Dict[str, Any]) -> Optional[Tuple[Optional[int], Optional[float], Optional[int]]]:
+    """(since_seq, since time, last) from query parameters or a {"type": "replay", ...} message."""
+    if not any(params.get(k) not in (None, "") for k in ("since_seq", "since", "last")):
+        return None
+    seq, last = params.get("since_seq"), params.get("last")
+    return (int(seq) if seq not in (None, "") else None, parse_since(params.get("since")),
+            int(last) if last not in (None, "") else None)
 
 @app.websocket("/stream")
 async def stream(ws: WebSocket):
-    await manager.connect(ws)
+    client = await manager.connect(ws)
+    params: Any = dict(ws.query_params)
     try:
+        # Subscribe on connect (/stream?min_risk=high&labels=a,b&platforms=..&sources=..) or
+        # by message: {"type": "subscribe", "min_risk": "high", "labels": [...], ...}.
+        # An invalid subscription closes the socket with 1008 (policy violation).
+        manager.subscribe(client, Subscription.from_params(params))
+        # Replay on connect (/stream?since_seq=N, ?since=<ISO time or epoch>, ?last=N) or on
+        # request: {"type": "replay", "since_seq": N, ...}; any other message is a keepalive
+        request = None
+        with suppress(ValueError):
+            request = replay_request(params)
+        if request:
+            manager.replay(client, *request)
         while True:
-            await ws.receive_text()  # keepalive
+            msg = await ws.receive_text()
+            if not msg.startswith("{"):
+                continue
+            try:
+                params = json.loads(msg)
+            except ValueError:
+                continue
+            if not isinstance(params, dict):
+                continue
+            if params.get("type") == "subscribe":
+                manager.subscribe(client, Subscription.from_params(params))
+            elif params.get("type") == "replay":
+                with suppress(ValueError, TypeError):
+                    # No parameters replays the whole buffer
+                    manager.replay(client, *(replay_request(params) or ()))
     except WebSocketDisconnect:
         await manager.disconnect(ws)
+    except (ValueError, TypeError) as e:
+        await manager.disconnect(ws)
+        with suppress(Exception):
+            await ws.close(code=1008, reason=str(e)[:120])
 
 @app.post("/ingest")
 async def ingest(item: IngestItem):
+    # Checked before dedup so a rejected post is not remembered and can be retried;
+    # nothing awaits between admit() and put(), so no other request can take the room
+    if not ingest_queue.admit():
+        return JSONResponse({"ok": False, "error": "ingest queue full"}, status_code=429,
+                            headers={"Retry-After": "1"})
     payload = item.dict()
+    duplicate = seen.check_and_add(repost_key(payload["text"]))
     if not payload.get("timestamp"):
         payload["timestamp"] = datetime.datetime.utcnow().isoformat() + "Z"
-    await manager.broadcast(payload)
-    return {"ok": True}
+    log_posts([payload])
+    # Returns without waiting for clients; the broadcaster task delivers it
+    ingest_queue.put([payload])
+    await sync_log()
+    return {"ok": True, "duplicate": True} if duplicate else {"ok": True}
+
+ingest_items = TypeAdapter(List[IngestItem])
+
+class BatchTooLarge(ValueError):
+    pass
+
+def parse_batch(body: bytes, max_items: int) -> List[IngestItem]:
+    """
+    A JSON array of items, or NDJSON (one item per line). The item count is checked
+    against max_items before any item is validated.
+    """
+    if body.lstrip()[:1] == b"[":
+        rows = json.loads(body)
+        if not isinstance(rows, list):
+            raise ValueError("expected an array of items")
+        if len(rows) > max_items:
+            raise BatchTooLarge(max_items)
+    else:
+        lines = [(lineno, line) for lineno, line in enumerate(body.splitlines(), 1) if line.strip()]
+        if len(lines) > max_items:
+            raise BatchTooLarge(max_items)
+        rows = []
+        for lineno, line in lines:
+            try:
+                rows.append(json.loads(line))
+            except ValueError as e:
+                raise ValueError(f"line {lineno}: {e}") from None
+    return ingest_items.validate_python(rows)
+
+@app.post("/ingest/batch")
+async def ingest_batch(request: Request):
+    """Queue many posts at once; clients receive them as one {"type": "batch"} frame."""
+    # A batch must fit in the ingest queue as well as under MAX_BATCH_ITEMS
+    max_items = min(MAX_BATCH_ITEMS, ingest_queue.maxsize)
+    try:
+        items = parse_batch(await request.body(), max_items)
+    except BatchTooLarge:
+        return JSONResponse({"ok": False, "error": f"at most {max_items} items per batch"}, status_code=413)
+    except ValidationError as e:
+        return JSONResponse({"ok": False, "errors": json.loads(e.json())[:20]}, status_code=422)
+    except ValueError as e:
+        return JSONResponse({"ok": False, "error": f"invalid JSON: {e}"}, status_code=400)
+    # Admission is decided here, after the body has arrived; nothing awaits before put()
+    if not items:
+        return {"ok": True, "accepted": 0, "duplicates": 0}
+    if not ingest_queue.admit(len(items)):
+        return JSONResponse({"ok": False, "error": "ingest queue full"}, status_code=429,
+                            headers={"Retry-After": "1"})
+
+    now = datetime.datetime.utcnow().isoformat() + "Z"
+    posts = ingest_items.dump_python(items)
+    duplicates = 0
+    for payload in posts:
+        duplicates += seen.check_and_add(repost_key(payload["text"]))
+        if not payload.get("timestamp"):
+            payload["timestamp"] = now
+    log_posts(posts)
+    ingest_queue.put(posts)
+    await sync_log()
+    return {"ok": True, "accepted": len(posts), "duplicates": duplicates}
+
+@app.get("/log")
+async def get_log(offset: int = 0, limit: int = 1000, partition: Optional[int] = None):
+    """
+    Logged posts from `offset` on; poll again from next_offset to follow the log. With
+    several workers each has its own partition (and offsets); pick one with `partition`.
+    """
+    if ingest_log is None:
+        return JSONResponse({"ok": False, "error": "ingest log disabled; set HARMWATCH_INGEST_LOG"},
+                            status_code=404)
+    limit = max(1, min(limit, MAX_BATCH_ITEMS))
+    if partition is not None and partition != ingest_log.partition:
+        # Another worker's partition: read its files, whatever it is writing right now
+        directory = partition_dir(os.getenv("HARMWATCH_INGEST_LOG"), partition)
+        records = await asyncio.to_thread(read_log, directory, offset, limit)
+        return {"ok": True, "partition": partition, "records": [{"offset": o, "item": item} for o, item in records],
+                "next_offset": records[-1][0] + 1 if records else offset}
+    records = await asyncio.to_thread(ingest_log.read, offset, limit)
+    stats = ingest_log.stats()
+    return {"ok": True, "partition": ingest_log.partition,
+            "records": [{"offset": o, "item": item} for o, item in records],
+            "next_offset": records[-1][0] + 1 if records else max(offset, stats["start_offset"]),
+            "start_offset": stats["start_offset"], "end_offset": stats["end_offset"],
+            "durable_offset": stats["durable_offset"]}
 
 @app.get("/health")
 async def health():
-    return {"status": "ok", "clients": len(manager.clients)}
+    return {"status": "ok", "clients": len(manager.clients), "duplicates": seen.duplicates,
+            "queue": ingest_queue.stats(), "classifier": classifier.stats(), "fanout": manager.stats(),
+            "replay": manager.replay_buffer.stats(),
+            "ingest_log": ingest_log.stats() if ingest_log is not None else None,
+            "pubsub": hub.stats() if hub is not None else None}
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # permessage-deflate is negotiated with clients that offer it; it costs CPU per client
+    # and frame, so busy bridges with many clients may prefer msgpack alone (=0)
+    deflate = os.getenv("HARMWATCH_WS_DEFLATE", "1") != "0"
+    port = int(os.getenv("HARMWATCH_BRIDGE_PORT", "8000"))
+    if UVICORN_WORKERS > 1:
+        import multiprocessing, tempfile
+        from pubsub import run_hub, wait_for_hub
+
+        # Workers inherit the socket path; the hub dies with this launcher (daemon)
+        path = os.path.join(tempfile.gettempdir(), f"harmwatch-hub-{os.getpid()}.sock")
+        os.environ["HARMWATCH_HUB_SOCKET"] = path
+        multiprocessing.Process(target=run_hub, args=(path,), name="harmwatch-hub", daemon=True).start()
+        wait_for_hub(path)
+        try:
+            uvicorn.run("bridge:app", host="0.0.0.0", port=port, workers=UVICORN_WORKERS,
+                        app_dir=os.path.dirname(os.path.abspath(__file__)), ws_per_message_deflate=deflate)
+        finally:
+            with suppress(FileNotFoundError):
+                os.unlink(path)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port, ws_per_message_deflate=deflate)
@@ -1,18 +1,228 @@
+import json
+import logging
+import os
 import re
-from typing import List, Tuple, Dict, Any
+import time
+import warnings
+from typing import List, Tuple, Dict, Any, Set, Iterable, Optional, Callable
 
-# Enhanced patterns from cybershield
-SHORTLINKS = {"bit.ly","tinyurl.com","t.co","goo.gl","ow.ly","is.gd","buff.ly","cutt.ly","rb.gy","s.id","t.ly"}
+from lexicon import Lexicon
+from rules import RuleSet, load_rules
 
-PATTERNS = {
-    "hate_speech": re.compile(r"\b(kill yourself|go back|subhuman|ape|monkey|dog|retard|retarded|faggot|slur|scum|racist|terrorist)\b", re.I),
-    "cyberbullying": re.compile(r"\b(you are (so )?dumb|nobody likes you|loser|ugly|worthless|kill yourself|idiot|stupid|hate)\b", re.I),
-    "misinformation": re.compile(r"\b(5g.*microchip|flat earth|chemtrails|plandemic|crisis actor|fake news|hoax|misleading)\b", re.I),
-    "privacy_risk": re.compile(r"\b(share your otp|one time password|ssn|aadhaar|pan number|account number|privacy|expose(?:d)?|doxx?)\b", re.I),
-    "hacking_exploit": re.compile(r"\b(cve-\d{4}-\d+|zero[- ]day|exploit|payload|rce|priv[- ]?esc|metasploit|hack(?:ed|ing)?|breach)\b", re.I),
-    "scam_phishing": re.compile(r"\b(urgent|verify|kyc|win .* prize|gift card|limited time|act now|bank.*block|click.*link|verify your account|free|prize|win|otp|password|login)\b", re.I),
-    "mental_health": re.compile(r"\b(hopeless|i hate myself|i want to die|self[- ]harm|cut myself|depress|suicid|lonely)\b", re.I),
-}
+logger = logging.getLogger(__name__)
+
+# Prebuilt matchers are cached here as matcher-<rules hash>-<format>.json
+ARTIFACT_DIR = os.getenv("HARMWATCH_RULES_CACHE") or os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "data", "rules_cache")
+# Bump when PatternMatcher changes how it builds its regexes
+MATCHER_FORMAT = 2
+
+def _top_level_alternation(src: str) -> bool:
+    """True if regex `src` has a | outside every group and character class."""
+    depth, i, in_class = 0, 0, False
+    while i < len(src):
+        ch = src[i]
+        if ch == "\\":
+            i += 2
+            continue
+        if in_class:
+            in_class = ch != "]"
+        elif ch == "[":
+            in_class = True
+            # A ] right after [ or [^ is a literal member, not the end of the class
+            i += 1
+            if src[i:i + 1] == "^":
+                i += 1
+            if src[i:i + 1] == "]":
+                i += 1
+            continue
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "|" and depth == 0:
+            return True
+        i += 1
+    return False
+
+class PatternMatcher:
+    """
+    Single-pass matcher over every PATTERNS category and SHORTLINKS domain.
+    All rules are folded into one zero-width alternation so the text is scanned
+    once; rules that also match at a hit position are picked up with a cheap
+    anchored check, so results equal running each pattern separately.
+    """
+
+    def __init__(self, patterns: Dict[str, "re.Pattern"], shortlinks: Set[str], source: Optional[str] = None):
+        self.patterns = dict(patterns)
+        self.shortlinks = set(shortlinks)
+        self.labels = list(self.patterns)
+        self._groups = {f"_c{i}": label for i, label in enumerate(self.labels)}
+        self._links_by_char: Dict[str, List[str]] = {}
+        for dom in sorted(self.shortlinks):
+            self._links_by_char.setdefault(dom[:1], []).append(dom)
+
+        self.source = self._combined_source() if source is None else source
+
+        # Text is lowercased before matching, so for ASCII input IGNORECASE only
+        # costs time; it is kept for non-ASCII text where case folding differs.
+        self._regex_i = re.compile(self.source, re.I)
+        self._regex_ascii = self._regex_i if re.search(r"(?<![\\?])[A-Z]", self.source) else re.compile(self.source)
+
+    def _combined_source(self) -> str:
+        bounded, free = [], []
+        for group, label in self._groups.items():
+            src = self.patterns[label].pattern
+            # A leading \b can only be shared when it scopes the whole pattern, not just
+            # the first of several alternatives (e.g. a pattern joined with its terms)
+            if src.startswith(r"\b") and not _top_level_alternation(src):
+                bounded.append(f"(?P<{group}>{src[2:]})")
+            else:
+                free.append(f"(?P<{group}>(?:{src}))")
+        alts = []
+        if bounded:
+            alts.append(r"\b(?:" + "|".join(bounded) + ")")
+        alts.extend(free)
+        if self.shortlinks:
+            alts.append("(?P<_link>" + "|".join(re.escape(d) for d in sorted(self.shortlinks)) + ")")
+        return "(?=" + "|".join(alts) + ")" if alts else r"(?!)"
+
+    def to_artifact(self) -> Dict[str, Any]:
+        """JSON-serializable form: every regex source, so loading skips all assembly work."""
+        return {
+            "format": MATCHER_FORMAT,
+            "patterns": [[label, p.pattern, p.flags] for label, p in self.patterns.items()],
+            "shortlinks": sorted(self.shortlinks),
+            "source": self.source,
+        }
+
+    @classmethod
+    def from_artifact(cls, data: Dict[str, Any]) -> "PatternMatcher":
+        if data.get("format") != MATCHER_FORMAT:
+            raise ValueError(f"matcher artifact format {data.get('format')} != {MATCHER_FORMAT}")
+        patterns = {label: re.compile(src, flags) for label, src, flags in data["patterns"]}
+        return cls(patterns, set(data["shortlinks"]), data["source"])
+
+    def scan(self, t: str) -> Tuple[Dict[str, str], Set[str]]:
+        """
+        Return ({label: first matched text}, {shortlink domains found in t}).
+        """
+        hits: Dict[str, str] = {}
+        links: Set[str] = set()
+        regex = self._regex_ascii if t.isascii() else self._regex_i
+        for m in regex.finditer(t):
+            pos = m.start()
+            group = m.lastgroup
+            if group == "_link":
+                links.add(m.group(group))
+            elif group is not None:
+                hits.setdefault(self._groups[group], m.group(group))
+            # The alternation reports one rule per position; check the rest here.
+            for label in self.labels:
+                if label not in hits:
+                    other = self.patterns[label].match(t, pos)
+                    if other:
+                        hits[label] = other.group(0)
+            for dom in self._links_by_char.get(t[pos:pos + 1], ()):
+                if dom not in links and t.startswith(dom, pos):
+                    links.add(dom)
+        return hits, links
+
+def compile_rules(rules: RuleSet) -> PatternMatcher:
+    return PatternMatcher({label: re.compile(src, re.I) for label, src in rules.sources().items()},
+                          rules.shortlinks)
+
+def load_matcher(rules: RuleSet, cache_dir: Optional[str] = ARTIFACT_DIR) -> PatternMatcher:
+    """
+    Matcher for `rules`, loaded from the artifact cache when an entry for this rules
+    hash exists; otherwise compiled and saved there for other processes to reuse.
+    cache_dir None disables the cache.
+    """
+    if not cache_dir:
+        return compile_rules(rules)
+    path = os.path.join(cache_dir, f"matcher-{rules.fingerprint}-{MATCHER_FORMAT}.json")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return PatternMatcher.from_artifact(json.load(f))
+    except FileNotFoundError:
+        pass
+    except (ValueError, KeyError, TypeError, re.error) as e:
+        warnings.warn(f"Ignoring unreadable matcher artifact {path}: {e}")
+
+    matcher = compile_rules(rules)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(matcher.to_artifact(), f)
+        os.replace(tmp, path)  # atomic, so concurrent workers never read a partial file
+    except OSError as e:
+        warnings.warn(f"Could not cache matcher artifact in {cache_dir}: {e}")
+    return matcher
+
+RULES = load_rules()
+MATCHER = load_matcher(RULES)
+# Term lists of any size are matched by token lookup rather than regex alternation
+LEXICON = Lexicon(RULES.lexicon_entries(), RULES.near_rules())
+
+# Module-level views of the active rule set
+LABELS = list(RULES.labels)
+PATTERNS = MATCHER.patterns
+SHORTLINKS = RULES.shortlinks
+# Risk weight per enhanced label
+WEIGHTS = RULES.weights
+# Map enhanced labels to legacy categories
+CATEGORY_MAPPING = RULES.categories
+# Stamped onto every classification result (and used to key cached results)
+RULES_VERSION = RULES.stamp
+
+# Per-post time budget; posts longer than one scan window (e.g. scraped pages) are scanned
+# window by window and scanning stops once the budget is spent. 0 disables the limit.
+CLASSIFY_BUDGET_MS = float(os.getenv("HARMWATCH_CLASSIFY_BUDGET_MS", "50"))
+SCAN_WINDOW_CHARS = 20_000
+# Windows overlap so a match straddling a boundary is still seen whole
+SCAN_OVERLAP_CHARS = 500
+_SPACE_RE = re.compile(r"\s")
+# Starts the `why` entry of a result the budget cut short; such results depend on timing
+BUDGET_NOTE = "time budget:"
+
+def _cut(t: str, pos: int) -> int:
+    # Windows start and end on whitespace so no word is split into a false match;
+    # text without whitespace nearby (base64, minified code) is cut where it stands
+    m = _SPACE_RE.search(t, pos, pos + SCAN_OVERLAP_CHARS)
+    return m.start() if m else min(pos, len(t))
+
+def budget_truncated(result: Dict[str, Any]) -> bool:
+    """True if the time budget stopped classify_enhanced before the end of the text."""
+    return BUDGET_NOTE in result["why"]
+
+def scan_text(t: str) -> Tuple[Dict[str, str], Set[str], Dict[str, Tuple[str, int]], int]:
+    """
+    Run the pattern matcher and the lexicon over lowercased t within the time budget.
+    Returns (pattern hits, shortlinks, lexicon hits, number of leading chars scanned).
+    """
+    if len(t) <= SCAN_WINDOW_CHARS:
+        hits, links = MATCHER.scan(t)
+        return hits, links, LEXICON.scan(t), len(t)
+
+    deadline = time.perf_counter() + CLASSIFY_BUDGET_MS / 1000 if CLASSIFY_BUDGET_MS > 0 else None
+    hits: Dict[str, str] = {}
+    links: Set[str] = set()
+    term_hits: Dict[str, Tuple[str, int]] = {}
+    start = 0
+    while True:
+        end = _cut(t, start + SCAN_WINDOW_CHARS)
+        window = t[start:end]
+        window_hits, window_links = MATCHER.scan(window)
+        for k, v in window_hits.items():
+            hits.setdefault(k, v)
+        links |= window_links
+        for k, (term, weight) in LEXICON.scan(window).items():
+            if k not in term_hits or weight > term_hits[k][1]:
+                term_hits[k] = (term, weight)
+        if end >= len(t) or (deadline is not None and time.perf_counter() > deadline):
+            return hits, links, term_hits, end
+        start = max(start + 1, _cut(t, end - SCAN_OVERLAP_CHARS))
 
 # Legacy patterns for backward compatibility
 CYBERBULLY = [r"\bidiot\b", r"\bstupid\b", r"\bkill yourself\b", r"\bhate\b"]
@@ -53,23 +263,33 @@ def classify(text: str, domains: List[str] = None) -> Tuple[str, str]:
 def classify_enhanced(text: str, domains: List[str] = None) -> Dict[str, Any]:
     """
     Enhanced classification function that returns detailed analysis.
-    Returns dict with labels, risk_score, risk_level, category, and why.
+    Returns dict with labels, risk_score, risk_level, category, why, and rules_version.
     """
+    started = time.perf_counter()
     t = text.lower() if text else ""
     matched = []
     why = []
     risk = 0
 
-    # Check enhanced patterns
-    for k, pat in PATTERNS.items():
-        m = pat.search(t)
-        if m:
+    # Check enhanced patterns and shortlinks in a single scan, then the term lexicon
+    hits, links, term_hits, scanned = scan_text(t)
+    weights = {}
+    for k in LABELS:
+        if k in hits:
             matched.append(k)
-            why.append(f"{k}: '{m.group(0)}'")
+            why.append(f"{k}: '{hits[k]}'")
+            weights[k] = WEIGHTS.get(k, 1)
+        if k in term_hits:
+            term, weight = term_hits[k]
+            if k not in weights:
+                matched.append(k)
+                why.append(f"{k}: '{term}'")
+            # A label scores the heaviest of its pattern and term weights
+            weights[k] = max(weights.get(k, weight), weight)
 
     # Check for shortlinks
     for dom in SHORTLINKS:
-        if dom in t:
+        if dom in links:
             if "scam_phishing" not in matched:
                 matched.append("scam_phishing")
                 why.append(f"shortlink domain: {dom}")
@@ -82,35 +302,25 @@ def classify_enhanced(text: str, domains: List[str] = None) -> Dict[str, Any]:
                     matched.append("scam_phishing")
                     why.append(f"suspicious domain: {dom}")
 
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if scanned < len(t):
+        why.append(f"{BUDGET_NOTE} scanned {scanned:,} of {len(t):,} chars")
+        logger.warning("Classification stopped after %d of %d chars (%.1f ms, budget %.0f ms)",
+                       scanned, len(t), elapsed_ms, CLASSIFY_BUDGET_MS)
+    elif 0 < CLASSIFY_BUDGET_MS < elapsed_ms:
+        logger.warning("Classifying a %d-char post took %.1f ms (budget %.0f ms)",
+                       len(t), elapsed_ms, CLASSIFY_BUDGET_MS)
+
     # Risk scoring
-    weights = {
-        "scam_phishing": 3,
-        "hacking_exploit": 3,
-        "privacy_risk": 3,
-        "hate_speech": 2,
-        "cyberbullying": 2,
-        "misinformation": 2,
-        "mental_health": 2,
-    }
     for m in matched:
-        risk += weights.get(m, 1)
+        risk += weights.get(m, WEIGHTS.get(m, 1))
 
     # Determine category and risk level
     if not matched:
         category = "Neutral"
         level = "low"
     else:
-        # Map enhanced labels to legacy categories
-        category_mapping = {
-            "scam_phishing": "Scam/Phishing",
-            "hacking_exploit": "Hacking/Exploit", 
-            "hate_speech": "Hate Speech",
-            "cyberbullying": "Cyberbullying",
-            "misinformation": "Misinformation",
-            "privacy_risk": "Privacy Risk",
-            "mental_health": "Mental Health Risk"
-        }
-        category = category_mapping.get(matched[0], "Other")
+        category = CATEGORY_MAPPING.get(matched[0], "Other")
         level = "high" if risk >= 5 else "medium" if risk >= 3 else "low"
 
     return {
@@ -118,9 +328,38 @@ def classify_enhanced(text: str, domains: List[str] = None) -> Dict[str, Any]:
         "risk_score": risk,
         "risk_level": level,
         "category": category,
-        "why": "; ".join(why) or "—"
+        "why": "; ".join(why) or "—",
+        "rules_version": RULES_VERSION,
     }
 
+BATCH_COLUMNS = ("labels", "risk_score", "risk_level", "category", "why", "rules_version")
+
+def classify_batch(texts: Iterable[str], domains: Optional[Iterable[List[str]]] = None,
+                   classify_fn: Callable[..., Dict[str, Any]] = None) -> Dict[str, List[Any]]:
+    """
+    Classify a whole column of posts (list or pandas Series) in one call.
+    Returns columnar lists keyed by labels, risk_score, risk_level, category, why and rules_version,
+    aligned with the input order. Repeated (text, domains) pairs are classified once.
+    classify_fn replaces classify_enhanced (e.g. classify_cache.classify_cached).
+    """
+    classify_fn = classify_fn or classify_enhanced
+    texts = list(texts)
+    domains = list(domains) if domains is not None else [None] * len(texts)
+    if len(domains) != len(texts):
+        raise ValueError(f"texts and domains differ in length ({len(texts)} != {len(domains)})")
+
+    columns: Dict[str, List[Any]] = {name: [] for name in BATCH_COLUMNS}
+    seen: Dict[Tuple[str, Tuple[str, ...]], Dict[str, Any]] = {}
+    for text, doms in zip(texts, domains):
+        key = (text, tuple(doms or ()))
+        result = seen.get(key)
+        if result is None:
+            result = seen[key] = classify_fn(text, doms or [])
+        columns["labels"].append(list(result["labels"]))
+        for name in BATCH_COLUMNS[1:]:
+            columns[name].append(result[name])
+    return columns
+
 # Legacy function for backward compatibility
 def classify_legacy(text: str, domains: List[str]) -> Tuple[str, str]:
     # domain heuristic
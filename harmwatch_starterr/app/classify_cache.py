@@ -0,0 +1,173 @@
+"""
+Cache for classify_enhanced results.
+Two tiers: an in-process LRU and an optional SQLite table shared between processes
+(set HARMWATCH_CLASSIFY_CACHE_DB). Keys combine the rule-set version
+(classify.RULES_VERSION), a hash of the lowercased text and the domain list, so a
+rule change never serves stale results. Results the time budget cut short are not
+cached, so a slow moment never pins a partial classification.
+"""
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import classify
+
+DEFAULT_SIZE = int(os.getenv("HARMWATCH_CLASSIFY_CACHE_SIZE", "100000"))
+FLUSH_EVERY = 500  # persistent-tier writes are batched
+
+CACHE_SCHEMA = """CREATE TABLE IF NOT EXISTS classify_cache (
+    version TEXT NOT NULL,
+    key BLOB NOT NULL,
+    result TEXT NOT NULL,
+    PRIMARY KEY (version, key)
+) WITHOUT ROWID"""
+
+def cache_key(text: Optional[str], domains: Optional[List[str]]) -> bytes:
+    """Digest of the inputs classify_enhanced depends on (it lowercases text itself)."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update((text.lower() if text else "").encode("utf-8"))
+    for dom in domains or ():
+        h.update(b"\x00")
+        h.update(dom.encode("utf-8"))
+    return h.digest()
+
+class ClassificationCache:
+    """
+    LRU of classify_enhanced results with an optional persistent SQLite tier.
+    Safe to share between threads; each process keeps its own memory tier.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_SIZE, db_path: Optional[str] = None):
+        self.maxsize = maxsize
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self._memory: "OrderedDict[Tuple[str, bytes], Dict[str, Any]]" = OrderedDict()
+        self._pending: List[Tuple[str, bytes, str]] = []
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self.con = None
+        if db_path:
+            self.con = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+            self.con.execute("PRAGMA journal_mode=WAL")
+            self.con.execute("PRAGMA synchronous=NORMAL")
+            with self.con:
+                self.con.execute(CACHE_SCHEMA)
+                # Entries from older rule sets can never hit again
+                self.con.execute("DELETE FROM classify_cache WHERE version != ?", (classify.RULES_VERSION,))
+
+    def classify(self, text: Optional[str], domains: Optional[List[str]] = None) -> Dict[str, Any]:
+        """classify_enhanced(text, domains), served from cache when possible."""
+        key = (classify.RULES_VERSION, cache_key(text, domains))
+        with self.lock:
+            result = self._memory.get(key)
+            if result is not None:
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return _copy(result)
+            if self.con is not None:
+                row = self.con.execute("SELECT result FROM classify_cache WHERE version = ? AND key = ?", key).fetchone()
+                if row:
+                    self.counters["disk_hits"] += 1
+                    result = json.loads(row[0])
+                    self._remember(key, result)
+                    return _copy(result)
+            self.counters["misses"] += 1
+
+        result = classify.classify_enhanced(text, domains)
+        if classify.budget_truncated(result):
+            # Partial and timing-dependent: the next call may get further
+            return _copy(result)
+        with self.lock:
+            self._remember(key, result)
+            if self.con is not None:
+                self._pending.append((key[0], key[1], json.dumps(result)))
+                if len(self._pending) >= FLUSH_EVERY:
+                    self._flush()
+        return _copy(result)
+
+    def _remember(self, key: Tuple[str, bytes], result: Dict[str, Any]):
+        if self.maxsize <= 0:
+            return
+        self._memory[key] = result
+        if len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def _flush(self):
+        if self._pending:
+            with self.con:
+                self.con.executemany("INSERT OR REPLACE INTO classify_cache VALUES (?, ?, ?)", self._pending)
+            self._pending.clear()
+
+    def flush(self):
+        """Write buffered entries to the persistent tier."""
+        with self.lock:
+            if self.con is not None:
+                self._flush()
+
+    def clear(self):
+        with self.lock:
+            self._memory.clear()
+            self._pending.clear()
+            if self.con is not None:
+                with self.con:
+                    self.con.execute("DELETE FROM classify_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters, hit rate and tier sizes."""
+        with self.lock:
+            lookups = sum(self.counters.values())
+            hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+            stats: Dict[str, Any] = dict(self.counters)
+            stats.update({
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "memory_size": len(self._memory),
+                "maxsize": self.maxsize,
+                "rules_version": classify.RULES_VERSION,
+            })
+            if self.con is not None:
+                stats["disk_size"] = self.con.execute("SELECT COUNT(*) FROM classify_cache").fetchone()[0]
+            return stats
+
+def _copy(result: Dict[str, Any]) -> Dict[str, Any]:
+    # Callers may mutate the labels list; cached entries must stay intact
+    return dict(result, labels=list(result["labels"]))
+
+_default: Optional[ClassificationCache] = None
+_default_lock = threading.Lock()
+# The parent's cache as a forked child inherited it; kept only so the child never closes
+# the parent's SQLite handle (SQLite connections must not be used across fork)
+_inherited: Optional[ClassificationCache] = None
+
+def get_cache() -> ClassificationCache:
+    """Process-wide cache configured from HARMWATCH_CLASSIFY_CACHE_SIZE / _DB."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = ClassificationCache(DEFAULT_SIZE, os.getenv("HARMWATCH_CLASSIFY_CACHE_DB") or None)
+        return _default
+
+def _flush_default():
+    if _default is not None:
+        _default.flush()
+
+def _reset_after_fork():
+    # Pool workers forked from a process that already classified start with a cache
+    # of their own: a fresh lock (the parent's may have been held) and connection
+    global _default, _default_lock, _inherited
+    _inherited, _default = _default, None
+    _default_lock = threading.Lock()
+
+atexit.register(_flush_default)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def classify_cached(text: Optional[str], domains: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Drop-in replacement for classify.classify_enhanced backed by the default cache."""
+    return get_cache().classify(text, domains)
+
+def cache_stats() -> Dict[str, Any]:
+    return get_cache().stats()
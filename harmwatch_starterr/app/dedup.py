@@ -0,0 +1,50 @@
+"""
+Exact-duplicate detection for reposts and copy-paste spam.
+Posts are keyed on a fast hash of what the classifier reads: the lowercased text and
+its link domains. Two posts with the same key always classify alike, whereas posts
+that only share a clean_text (a different link, a stripped word) may not.
+"""
+import hashlib
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+
+def content_hash(text: Optional[str], domains: Optional[Iterable[str]] = None) -> Optional[str]:
+    """16-hex BLAKE2b digest of a post's text (case-insensitive) and domains; None for empty text (never deduplicated)."""
+    if not text or not isinstance(text, str):
+        return None
+    h = hashlib.blake2b(text.lower().encode("utf-8"), digest_size=8)
+    for dom in sorted(domains or ()):
+        h.update(b"\x00")
+        h.update(dom.encode("utf-8"))
+    return h.hexdigest()
+
+def content_hashes(texts: Iterable[Optional[str]], domains: Iterable[Optional[List[str]]]) -> List[Optional[str]]:
+    """Batch content_hash over aligned lists or Series of texts and domain lists."""
+    return [content_hash(t, d if isinstance(d, list) else None) for t, d in zip(texts, domains)]
+
+class SeenSet:
+    """
+    Bounded, insertion-ordered set of recently seen content hashes for the live stream.
+    The oldest hash is evicted once `maxsize` is reached; maxsize 0 disables dedup.
+    """
+
+    def __init__(self, maxsize: int = 100_000):
+        self.maxsize = maxsize
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self.duplicates = 0
+
+    def check_and_add(self, key: Optional[str]) -> bool:
+        """Record key; True if it was already in the window (i.e. a duplicate)."""
+        if key is None or self.maxsize <= 0:
+            return False
+        if key in self._seen:
+            self._seen.move_to_end(key)
+            self.duplicates += 1
+            return True
+        self._seen[key] = None
+        if len(self._seen) > self.maxsize:
+            self._seen.popitem(last=False)
+        return False
+
+    def __len__(self) -> int:
+        return len(self._seen)
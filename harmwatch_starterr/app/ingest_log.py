@@ -0,0 +1,311 @@
+"""
+Durable append-only log of ingested posts (set HARMWATCH_INGEST_LOG to a directory).
+Records are NDJSON lines numbered by offset, in segment files named after the offset
+of their first record (00000000000000000000.ndjson). Each segment has a sparse .index
+of (offset, byte position) pairs, so reading from an offset seeks close to it instead
+of scanning. Appends are written to the OS at once and fsynced in batches by sync();
+durable_offset says how far a crash can no longer reach. sync() also starts a new
+segment once the active one has reached segment_bytes, and deletes whole segments
+once the log exceeds its size or age limit.
+Bridges with several worker processes give each worker its own partition directory
+(worker-0, worker-1, ...); read_log reads any partition without opening it for writing.
+"""
+import bisect
+import fcntl
+import json
+import logging
+import os
+import struct
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_BYTES = int(os.getenv("HARMWATCH_INGEST_LOG_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+RETENTION_BYTES = int(os.getenv("HARMWATCH_INGEST_LOG_RETENTION_BYTES", str(1024 * 1024 * 1024)))
+RETENTION_HOURS = float(os.getenv("HARMWATCH_INGEST_LOG_RETENTION_HOURS", "168"))
+INDEX_INTERVAL_BYTES = 4096  # one index entry per this many bytes of records
+INDEX_ENTRY = struct.Struct(">QQ")  # offset, byte position in the segment
+
+def _segment_name(base: int, ext: str) -> str:
+    return f"{base:020d}.{ext}"
+
+def _segment_bases(directory: str) -> List[int]:
+    return sorted(int(name.split(".")[0]) for name in os.listdir(directory)
+                  if name.endswith(".ndjson") and name.split(".")[0].isdigit())
+
+def _load_index(path: str) -> List[Tuple[int, int]]:
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return []
+    usable = len(data) - len(data) % INDEX_ENTRY.size
+    return [INDEX_ENTRY.unpack_from(data, i) for i in range(0, usable, INDEX_ENTRY.size)]
+
+def _read_segments(directory: str, bases: List[int], offset: int, end: float, limit: int,
+                   load_index: Callable[[int], List[Tuple[int, int]]]) -> List[Tuple[int, Dict[str, Any]]]:
+    out: List[Tuple[int, Dict[str, Any]]] = []
+    if not bases:
+        return out
+    offset = max(offset, bases[0])
+    i = max(0, bisect.bisect_right(bases, offset) - 1)
+    while i < len(bases) and offset < end and len(out) < limit:
+        base = bases[i]
+        index = load_index(base)
+        # Nearest indexed position at or before the wanted offset
+        j = bisect.bisect_right(index, (offset, float("inf"))) - 1
+        current, pos = index[j] if j >= 0 else (base, 0)
+        try:
+            with open(os.path.join(directory, _segment_name(base, "ndjson")), "rb") as f:
+                f.seek(pos)
+                for line in f:
+                    if not line.endswith(b"\n") or current >= end or len(out) >= limit:
+                        break  # a record still being written, or enough
+                    if current >= offset:
+                        out.append((current, json.loads(line)))
+                    current += 1
+        except FileNotFoundError:
+            pass  # deleted by retention meanwhile; continue with the next segment
+        offset = max(offset, current)
+        i += 1
+    return out
+
+def _encode(record: Dict[str, Any]) -> bytes:
+    # json escapes newlines inside strings, so a record is always one line
+    return (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+class IngestLog:
+    """
+    Segmented NDJSON log. append() may be called from one thread (the event loop)
+    while sync() and read() run in others; it only ever writes to the OS, and `lock`
+    is never held across an fsync or a file deletion.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = SEGMENT_BYTES,
+                 retention_bytes: int = RETENTION_BYTES, retention_seconds: float = RETENTION_HOURS * 3600):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.retention_bytes = retention_bytes
+        self.retention_seconds = retention_seconds
+        self.lock = threading.Lock()
+        self.sync_lock = threading.Lock()  # one sync() at a time; append() never takes it
+        self.counters = {"appended": 0, "syncs": 0, "segments_deleted": 0, "truncated_bytes": 0}
+        os.makedirs(directory, exist_ok=True)
+        self.partition: Optional[int] = None
+        self._lock_file = None
+        self.bases = _segment_bases(directory)
+        if not self.bases:
+            self.bases = [0]
+        self._index_cache: Tuple[int, List[Tuple[int, int]]] = (-1, [])
+        self._recover()
+        self.durable_offset = self.next_offset
+
+    def _path(self, base: int, ext: str) -> str:
+        return os.path.join(self.directory, _segment_name(base, ext))
+
+    def _recover(self):
+        """Open the last segment for appending: drop a torn final line and rebuild its index."""
+        base = self.bases[-1]
+        path = self._path(base, "ndjson")
+        with open(path, "a+b") as f:
+            f.seek(0)
+            data = f.read()
+            end = data.rfind(b"\n") + 1
+            if end < len(data):
+                logger.warning("%s: dropping %d bytes of an incomplete record", path, len(data) - end)
+                self.counters["truncated_bytes"] += len(data) - end
+                f.truncate(end)
+                data = data[:end]
+        entries, offset, pos, last_indexed = [], base, 0, 0
+        for line in data.splitlines(keepends=True):
+            if pos - last_indexed >= INDEX_INTERVAL_BYTES:
+                entries.append((offset, pos))
+                last_indexed = pos
+            offset += 1
+            pos += len(line)
+        with open(self._path(base, "index"), "wb") as f:
+            f.write(b"".join(INDEX_ENTRY.pack(*e) for e in entries))
+        self.next_offset = offset
+        self._open_active(base, pos, last_indexed)
+
+    def _open_active(self, base: int, size: int, last_indexed: int = 0):
+        self.active_base = base
+        self.active_size = size
+        self.last_indexed = last_indexed
+        self.file = open(self._path(base, "ndjson"), "ab")
+        self.index_file = open(self._path(base, "index"), "ab")
+
+    def _roll(self) -> List[Any]:
+        """Start a new active segment at next_offset; returns the full one's files (under lock)."""
+        full = [self.file, self.index_file]
+        for f in full:
+            f.flush()
+        self.bases.append(self.next_offset)
+        self._open_active(self.next_offset, 0)
+        return full
+
+    def append(self, records: List[Dict[str, Any]]) -> int:
+        """
+        Write records; returns the offset of the first. Durable after the next sync(),
+        which also rolls the segment, so a segment can outgrow segment_bytes by what
+        is appended between two syncs.
+        """
+        lines = [_encode(record) for record in records]
+        with self.lock:
+            first = self.next_offset
+            for line in lines:
+                if self.active_size - self.last_indexed >= INDEX_INTERVAL_BYTES:
+                    self.index_file.write(INDEX_ENTRY.pack(self.next_offset, self.active_size))
+                    self.last_indexed = self.active_size
+                self.file.write(line)
+                self.active_size += len(line)
+                self.next_offset += 1
+            self.file.flush()
+            self.index_file.flush()
+            self.counters["appended"] += len(lines)
+        return first
+
+    def sync(self):
+        """
+        fsync everything appended so far, roll a full segment and apply retention.
+        Blocks; call it off the event loop.
+        """
+        with self.sync_lock:
+            with self.lock:
+                target = self.next_offset
+                full = self._roll() if self.active_size >= self.segment_bytes else []
+                # A duplicate descriptor stays valid even if the file is closed meanwhile;
+                # after a roll everything up to target is in the full segment instead
+                fd = os.dup(self.file.fileno()) if target != self.durable_offset and not full else None
+            if fd is not None:
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            for f in full:
+                os.fsync(f.fileno())
+                f.close()
+            if full:
+                # Make the new segment's file names durable too
+                dir_fd = os.open(self.directory, os.O_RDONLY)
+                try:
+                    os.fsync(dir_fd)
+                finally:
+                    os.close(dir_fd)
+            with self.lock:
+                if target != self.durable_offset:
+                    self.durable_offset = max(self.durable_offset, target)
+                    self.counters["syncs"] += 1
+            self._retain()
+
+    def _retain(self):
+        # Oldest first; the active segment is never deleted. Only sync() changes bases
+        # (holding sync_lock), so the lock is needed just to publish the new list.
+        bases = self.bases[:-1]
+        if not bases:
+            return
+        now = time.time()
+        sizes = [self._size(base) for base in bases]
+        total = self.active_size + sum(sizes)
+        expired = 0
+        for base, size in zip(bases, sizes):
+            try:
+                # A segment's mtime is the time of its newest record
+                age = now - os.path.getmtime(self._path(base, "ndjson"))
+            except FileNotFoundError:
+                age = float("inf")
+            if total <= self.retention_bytes and age <= self.retention_seconds:
+                break
+            total -= size
+            expired += 1
+        if not expired:
+            return
+        with self.lock:
+            del self.bases[:expired]
+            self.counters["segments_deleted"] += expired
+        # Readers that listed these segments before skip files that are gone
+        for base in bases[:expired]:
+            for ext in ("ndjson", "index"):
+                try:
+                    os.remove(self._path(base, ext))
+                except FileNotFoundError:
+                    pass
+
+    def _size(self, base: int) -> int:
+        try:
+            return os.path.getsize(self._path(base, "ndjson"))
+        except FileNotFoundError:
+            return 0
+
+    @property
+    def start_offset(self) -> int:
+        """Oldest offset still retained."""
+        return self.bases[0]
+
+    def _load_index(self, base: int) -> List[Tuple[int, int]]:
+        if self._index_cache[0] == base and base != self.active_base:
+            return self._index_cache[1]
+        entries = _load_index(self._path(base, "index"))
+        self._index_cache = (base, entries)
+        return entries
+
+    def read(self, offset: int, limit: int = 1000) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        Up to `limit` (offset, record) pairs from `offset` on. Offsets older than
+        start_offset have been deleted by retention; reading resumes at the oldest kept.
+        """
+        with self.lock:
+            bases, end = list(self.bases), self.next_offset
+        return _read_segments(self.directory, bases, offset, end, limit, self._load_index)
+
+    def close(self):
+        self.sync()
+        with self.lock:
+            self.file.close()
+            self.index_file.close()
+        if self._lock_file is not None:
+            self._lock_file.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"directory": self.directory, "partition": self.partition, "start_offset": self.bases[0], "end_offset": self.next_offset,
+                    "durable_offset": self.durable_offset, "segments": len(self.bases),
+                    "bytes": self.active_size + sum(self._size(base) for base in self.bases[:-1]),
+                    **self.counters}
+
+def partition_dir(directory: str, partition: int) -> str:
+    return os.path.join(directory, f"worker-{partition}")
+
+def open_ingest_log(partitioned: bool = False) -> Optional[IngestLog]:
+    """
+    The log configured by HARMWATCH_INGEST_LOG, or None when it is not set. Partitioned,
+    it takes the lowest-numbered partition no other live process holds (an flock), so a
+    restarted worker carries on with the partition its predecessor left.
+    """
+    directory = os.getenv("HARMWATCH_INGEST_LOG")
+    if not directory:
+        return None
+    if not partitioned:
+        return IngestLog(directory)
+    os.makedirs(directory, exist_ok=True)
+    partition = 0
+    while True:
+        lock_file = open(os.path.join(directory, f"worker-{partition}.lock"), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            partition += 1
+            continue
+        log = IngestLog(partition_dir(directory, partition))
+        log.partition, log._lock_file = partition, lock_file
+        return log
+
+def read_log(directory: str, offset: int, limit: int = 1000) -> List[Tuple[int, Dict[str, Any]]]:
+    """IngestLog.read for a log another process may be writing (e.g. another worker's partition)."""
+    if not os.path.isdir(directory):
+        return []
+    return _read_segments(directory, _segment_bases(directory), offset, float("inf"), limit,
+                          lambda base: _load_index(os.path.join(directory, _segment_name(base, "index"))))
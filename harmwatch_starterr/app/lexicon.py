@@ -0,0 +1,147 @@
+"""
+Keyword engine for large term lists (tens of thousands of slurs, scam phrases, ...).
+Terms are matched on word tokens: the post is tokenized once and every token that
+can start a term is looked up as an n-gram in a hash table, so the cost per post
+depends on the post length and the longest term, not on the vocabulary size.
+Punctuation and whitespace between words are ignored ("gift-card" matches "gift card").
+Proximity rules replace unbounded regex wildcards such as `win .* prize`: they are
+checked in the same linear pass and never backtrack.
+"""
+import csv
+import re
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Set, Tuple
+
+WORD_RE = re.compile(r"\w+")
+_WORD_EDGES = re.compile(r"\w(?:.*\w)?", re.S)
+GATE_MAX_WORDS = 256
+
+def is_word_term(term: str) -> bool:
+    """True if term starts and ends with a word character (i.e. token matching can express it)."""
+    return bool(_WORD_EDGES.fullmatch(term.strip()))
+
+def term_key(term: str) -> str:
+    """Lookup key of a term: its lowercased word tokens joined by single spaces."""
+    return " ".join(WORD_RE.findall(term.lower()))
+
+class Lexicon:
+    """
+    Term -> (label, weight) table matched by token n-gram lookup, plus proximity rules
+    ("first" followed by "then" with at most `within` tokens in between) evaluated in
+    the same pass. A term may belong to several labels; per label the highest-weight
+    hit is kept.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, str, int]] = (),
+                 near: Iterable[Tuple[str, str, str, int, int, bool]] = ()):
+        self._terms: Dict[str, List[Tuple[str, int]]] = {}
+        # Proximity rules as (label, within, weight); phrase -> [(rule index, is the "then" phrase)]
+        self._near: List[Tuple[str, int, int]] = []
+        self._roles: Dict[str, List[Tuple[int, bool]]] = {}
+        # Every leading run of tokens of every phrase ("gift", "gift card", ...)
+        self._prefixes: Set[str] = set()
+        for term, label, weight in entries:
+            self.add(term, label, weight)
+        for label, first, then, within, weight, ordered in near:
+            self.add_near(label, first, then, within, weight, ordered)
+        self._gate = None  # compiled pre-check, built on first scan; False when not worth it
+
+    def _index(self, key: str):
+        self._gate = None
+        prefix = ""
+        for tok in key.split(" "):
+            prefix = f"{prefix} {tok}" if prefix else tok
+            self._prefixes.add(prefix)
+
+    def add(self, term: str, label: str, weight: int):
+        key = term_key(term)
+        if not key:
+            return
+        self._terms.setdefault(key, []).append((label, weight))
+        self._index(key)
+
+    def add_near(self, label: str, first: str, then: str, within: int, weight: int, ordered: bool = True):
+        """Match `then` at most `within` tokens after `first` (or before it too, unless ordered)."""
+        a, b = term_key(first), term_key(then)
+        if not a or not b:
+            return
+        for a, b in [(a, b)] if ordered else [(a, b), (b, a)]:
+            idx = len(self._near)
+            self._near.append((label, within, weight))
+            self._roles.setdefault(a, []).append((idx, False))
+            self._roles.setdefault(b, []).append((idx, True))
+            self._index(a)
+            self._index(b)
+
+    def __len__(self) -> int:
+        return len(self._terms) + len(self._near)
+
+    def _may_match(self, t: str) -> bool:
+        # With few distinct first words, one C-level regex search rejects most posts
+        # before tokenizing; large vocabularies go straight to the token loop
+        if self._gate is None:
+            firsts = {key for key in self._prefixes if " " not in key}
+            self._gate = (re.compile(r"\b(?:" + "|".join(map(re.escape, sorted(firsts))) + r")\b")
+                          if len(firsts) <= GATE_MAX_WORDS else False)
+        return self._gate is False or self._gate.search(t) is not None
+
+    def scan(self, t: str) -> Dict[str, Tuple[str, int]]:
+        """
+        Return {label: (matched text, weight)} for already-lowercased text t.
+        Proximity hits report the tokens from `first` through `then`.
+        """
+        found: Dict[str, Tuple[str, int]] = {}
+        if not self._prefixes or not self._may_match(t):
+            return found
+        toks = WORD_RE.findall(t)
+        terms, roles, prefixes, near = self._terms, self._roles, self._prefixes, self._near
+        # Rule index -> (start, end) token spans of "first" phrases seen so far
+        firsts: Dict[int, Deque[Tuple[int, int]]] = {}
+
+        def record(label: str, text: str, weight: int):
+            prev = found.get(label)
+            if prev is None or weight > prev[1]:
+                found[label] = (text, weight)
+
+        for i, key in enumerate(toks):
+            # Extend the n-gram one token at a time while some phrase still starts with it
+            j = i
+            while key in prefixes:
+                j += 1  # key == " ".join(toks[i:j])
+                for label, weight in terms.get(key, ()):
+                    record(label, key, weight)
+                for idx, is_then in roles.get(key, ()):
+                    if not is_then:
+                        firsts.setdefault(idx, deque()).append((i, j))
+                        continue
+                    label, within, weight = near[idx]
+                    spans = firsts.get(idx)
+                    if not spans:
+                        continue
+                    # Earlier "first" phrases can never come within range again
+                    while spans and i - spans[0][1] > within:
+                        spans.popleft()
+                    for a_start, a_end in reversed(spans):
+                        if a_end <= i:
+                            record(label, " ".join(toks[a_start:j]), weight)
+                            break
+                if j == len(toks):
+                    break
+                key = f"{key} {toks[j]}"
+        return found
+
+def read_lexicon(path: str, default_weights: Dict[str, int]) -> List[Tuple[str, str, int]]:
+    """
+    Read a tab-separated lexicon: `term<TAB>label[<TAB>weight]`, '#' starts a comment line.
+    Labels must exist in default_weights, which also supplies missing weights.
+    """
+    entries = []
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for lineno, row in enumerate(csv.reader(f, delimiter="\t", quoting=csv.QUOTE_NONE), 1):
+            if not row or not row[0].strip() or row[0].lstrip().startswith("#"):
+                continue
+            if len(row) < 2 or row[1] not in default_weights:
+                raise ValueError(f"{path}:{lineno}: expected 'term<TAB>label[<TAB>weight]' with a known label")
+            weight = int(row[2]) if len(row) > 2 and row[2].strip() else default_weights[row[1]]
+            entries.append((row[0], row[1], weight))
+    return entries
@@ -2,16 +2,26 @@ import asyncio
 import json
 import os
 from datetime import datetime
+from urllib.parse import urlencode
 import pandas as pd
 import streamlit as st
 import websockets
 import requests
 from bs4 import BeautifulSoup
 
-from classify import classify_enhanced
+try:  # optional: binary frames from the bridge
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from classify_cache import classify_cached
 from url_analyzer import fetch_text_from_url, analyze_url
 
 WS_URL = os.getenv("HARMWATCH_WS", "ws://localhost:8000/stream")
+FEED_ROWS = 200
+# Offered to the bridge in order of preference; it answers in JSON if it supports neither
+SUBPROTOCOLS = (["harmwatch.msgpack"] if msgpack is not None else []) + ["harmwatch.json"]
+WS_DEFLATE = os.getenv("HARMWATCH_WS_DEFLATE", "1") != "0"
 
 st.set_page_config(page_title="HarmWatch Live", page_icon="🔄", layout="wide")
 st.title("🔄 HarmWatch Live — Real-Time Social Media Harm Analyzer")
@@ -33,41 +43,67 @@ def to_df():
 
 async def listen_and_classify():
     try:
-        async with websockets.connect(WS_URL) as ws:
+        # Warm up from the bridge's replay buffer instead of waiting for new traffic; asked
+        # for at connect time, the replay arrives before any live post. The bridge only
+        # sends (and replays) posts matching the subscription.
+        params = {"last": FEED_ROWS}
+        if min_risk != "low":
+            params["min_risk"] = min_risk
+        if platforms.strip():
+            params["platforms"] = platforms
+        stream_url = f"{WS_URL}{'&' if '?' in WS_URL else '?'}{urlencode(params)}"
+        async with websockets.connect(stream_url, subprotocols=SUBPROTOCOLS,
+                                      compression="deflate" if WS_DEFLATE else None) as ws:
             status.success(f"Connected to {WS_URL}")
             await ws.send("ready")
+            last_seq = 0
             while True:
                 msg = await ws.recv()
                 try:
-                    payload = json.loads(msg) if isinstance(msg, str) else msg
+                    # Text frames are JSON, binary frames MessagePack
+                    payload = json.loads(msg) if isinstance(msg, str) else msgpack.unpackb(msg)
                 except Exception:
                     continue
-                
-                text = payload.get("text", "")
-                source = payload.get("source", "unknown")
-                author = payload.get("author") or "anon"
-                timestamp = payload.get("timestamp") or datetime.utcnow().isoformat()+"Z"
-                platform = payload.get("platform", "unknown")
-                url = payload.get("url", "")
-
-                # Enhanced classification
-                result = classify_enhanced(text)
-                row = {
-                    "time": timestamp,
-                    "source": source,
-                    "author": author,
-                    "text": text,
-                    "labels": ", ".join(result["labels"]),
-                    "risk_level": result["risk_level"],
-                    "risk_score": result["risk_score"],
-                    "why": result["why"],
-                    "platform": platform,
-                    "url": url
-                }
-                data.append(row)
+
+                # A slow consumer may receive several posts coalesced into one batch frame
+                if isinstance(payload, dict) and payload.get("type") == "batch":
+                    posts = payload.get("items", [])
+                else:
+                    posts = [payload]
+
+                for payload in posts:
+                    # Skip anything already shown (a bridge may replay overlapping posts)
+                    seq = payload.get("seq")
+                    if seq is not None:
+                        if seq <= last_seq:
+                            continue
+                        last_seq = seq
+                    text = payload.get("text", "")
+                    source = payload.get("source", "unknown")
+                    author = payload.get("author") or "anon"
+                    timestamp = payload.get("timestamp") or datetime.utcnow().isoformat()+"Z"
+                    platform = payload.get("platform", "unknown")
+                    url = payload.get("url", "")
+
+                    # The bridge classifies each post once at ingest; only posts from an
+                    # older bridge without classification are classified here
+                    result = payload if "risk_level" in payload else classify_cached(text)
+                    row = {
+                        "time": timestamp,
+                        "source": source,
+                        "author": author,
+                        "text": text,
+                        "labels": ", ".join(result["labels"]),
+                        "risk_level": result["risk_level"],
+                        "risk_score": result["risk_score"],
+                        "why": result["why"],
+                        "platform": platform,
+                        "url": url
+                    }
+                    data.append(row)
 
                 # Update live dashboard
-                df = to_df().tail(200)
+                df = to_df().tail(FEED_ROWS)
                 with log_holder.container():
                     st.subheader("Live Feed")
                     st.dataframe(df, use_container_width=True, height=320)
@@ -97,6 +133,8 @@ with controls:
     if ws_url != WS_URL:
         os.environ["HARMWATCH_WS"] = ws_url
         st.experimental_rerun()
+    min_risk = st.selectbox("Minimum risk level", ["low", "medium", "high"])
+    platforms = st.text_input("Platforms (comma-separated, empty for all)")
 
     st.markdown("**Analyze a single URL**")
     url_input = st.text_input("Enter post URL (YouTube / X / Instagram / public pages)")
@@ -107,7 +145,7 @@ with controls:
             st.write(fetched)
             
             # Analyze the extracted text
-            result = classify_enhanced(fetched)
+            result = classify_cached(fetched)
             st.markdown("**Analysis Result:**")
             st.write({
                 "labels": result["labels"],
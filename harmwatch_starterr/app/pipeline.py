@@ -0,0 +1,169 @@
+"""
+Batch pipeline: preprocessing + classification over a DataFrame of posts,
+optionally split across worker processes, or streamed from a CSV in chunks.
+enrich_posts does the same for lists of post dicts (the live bridge).
+"""
+import math
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional
+
+import pandas as pd
+
+from classify import BATCH_COLUMNS, classify_batch
+from classify_cache import classify_cached, get_cache
+from dedup import content_hashes
+from preprocess import clean_texts, anonymize_ids, extract_domains_batch
+from storage import init_db, insert_df, posts_frame
+
+OPTIONAL_COLUMNS = ["platform", "date", "author_id", "url"]
+MIN_CHUNK_ROWS = 5_000
+CHUNKS_PER_WORKER = 4
+DEFAULT_STREAM_CHUNK_ROWS = 50_000
+
+def process_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Clean, anonymize and classify one frame in the current process.
+    Returns a copy with clean_text, author_hash, domains, category, risk_level,
+    rules_version and content_hash (dedup key) added.
+    """
+    out = df.copy()
+    for col in OPTIONAL_COLUMNS:
+        if col not in out.columns:
+            out[col] = ""
+
+    out["clean_text"] = clean_texts(out["text"])
+    out["author_hash"] = anonymize_ids(out["author_id"])
+    out["domains"] = extract_domains_batch(out["text"])
+
+    # classify_batch classifies each distinct (clean_text, domains) pair once,
+    # and the classification cache skips pairs seen in earlier runs
+    results = classify_batch(out["clean_text"], out["domains"], classify_fn=classify_cached)
+    get_cache().flush()
+    out["category"], out["risk_level"] = results["category"], results["risk_level"]
+    out["rules_version"] = results["rules_version"]
+    out["content_hash"] = content_hashes(out["text"], out["domains"])
+    return out
+
+def enrich_posts(posts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Record-oriented process_frame for the live bridge: returns copies of the post dicts
+    with clean_text, author_hash, domains and the classify_batch fields added.
+    Like the live dashboard before it, this classifies the raw text (so shortlinks
+    written without a scheme still count) rather than clean_text.
+    """
+    texts = [post.get("text") or "" for post in posts]
+    cleaned = clean_texts(texts)
+    domains = extract_domains_batch(texts)
+    hashes = anonymize_ids(post.get("author") for post in posts)
+    results = classify_batch(texts, domains, classify_fn=classify_cached)
+    get_cache().flush()
+    out = []
+    for i, post in enumerate(posts):
+        enriched = dict(post, clean_text=cleaned[i], author_hash=hashes[i], domains=domains[i])
+        for name in BATCH_COLUMNS:
+            enriched[name] = results[name][i]
+        out.append(enriched)
+    return out
+
+def run(df: pd.DataFrame, workers: Optional[int] = None, chunk_rows: Optional[int] = None) -> pd.DataFrame:
+    """
+    Process df with `workers` processes (1 or None runs in-process).
+    The frame is split into contiguous chunks; each worker imports this module,
+    and with it the compiled classification patterns, once at start-up.
+    Results are concatenated back in the original row order.
+    """
+    workers = max(1, workers or 1)
+    if chunk_rows is None:
+        chunk_rows = max(MIN_CHUNK_ROWS, math.ceil(len(df) / (workers * CHUNKS_PER_WORKER)))
+    if workers == 1 or len(df) <= chunk_rows:
+        return process_frame(df)
+
+    chunks = [df.iloc[i:i + chunk_rows] for i in range(0, len(df), chunk_rows)]
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+        parts = list(pool.map(process_frame, chunks))
+    return pd.concat(parts)
+
+def _require_text(chunk: pd.DataFrame) -> pd.DataFrame:
+    if "text" not in chunk.columns:
+        raise ValueError("CSV must contain a 'text' column.")
+    return chunk
+
+class RunningAggregates:
+    """
+    Chart data accumulated chunk by chunk, so a streamed run never needs the full frame.
+    """
+
+    def __init__(self, max_flagged: int = 50):
+        self.rows = 0
+        self.category_counts: Counter = Counter()
+        self.daily_counts: Counter = Counter()  # (day, category) -> posts
+        self.max_flagged = max_flagged
+        self.flagged = pd.DataFrame()
+
+    def update(self, df: pd.DataFrame):
+        self.rows += len(df)
+        self.category_counts.update(df["category"].value_counts().to_dict())
+
+        days = pd.to_datetime(df["date"], errors="coerce").dt.date
+        dated = pd.DataFrame({"day": days, "category": df["category"]}).dropna(subset=["day"])
+        self.daily_counts.update(dated.value_counts().to_dict())
+
+        if len(self.flagged) < self.max_flagged:
+            flagged = df[df["category"] != "Neutral"].head(self.max_flagged - len(self.flagged))
+            self.flagged = pd.concat([self.flagged, flagged]) if len(self.flagged) else flagged
+
+    def category_series(self) -> pd.Series:
+        return pd.Series(self.category_counts, dtype="int64").sort_values(ascending=False)
+
+    def daily_pivot(self) -> pd.DataFrame:
+        """Posts per day by category (same shape as the in-memory trend pivot)."""
+        if not self.daily_counts:
+            return pd.DataFrame()
+        s = pd.Series(self.daily_counts)
+        s.index = s.index.set_names(["day", "category"])
+        return s.unstack("category").fillna(0).sort_index()
+
+def _ordered_results(pool: ProcessPoolExecutor, chunks: Iterable[pd.DataFrame], in_flight: int) -> Iterator[pd.DataFrame]:
+    """Like pool.map, but keeps at most `in_flight` chunks read ahead instead of the whole input."""
+    pending: Deque = deque()
+    for chunk in chunks:
+        pending.append(pool.submit(process_frame, chunk))
+        if len(pending) >= in_flight:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def run_stream(source, chunksize: int = DEFAULT_STREAM_CHUNK_ROWS, workers: Optional[int] = None,
+               out_csv: Optional[str] = None, save_db: bool = False,
+               on_chunk: Optional[Callable[[RunningAggregates], None]] = None) -> RunningAggregates:
+    """
+    Stream a CSV (path or file object) through the pipeline `chunksize` rows at a time.
+    Each processed chunk is appended to out_csv and/or the SQLite posts table and then
+    dropped; only RunningAggregates are kept. on_chunk is called after every chunk.
+    """
+    agg = RunningAggregates()
+    reader = pd.read_csv(source, chunksize=chunksize)
+    if save_db:
+        init_db()
+
+    def consume(processed: pd.DataFrame):
+        if out_csv:
+            processed.to_csv(out_csv, mode="w" if agg.rows == 0 else "a", header=agg.rows == 0, index=False)
+        if save_db:
+            insert_df(posts_frame(processed))
+        agg.update(processed)
+        if on_chunk:
+            on_chunk(agg)
+
+    workers = max(1, workers or 1)
+    if workers == 1:
+        for chunk in reader:
+            _require_text(chunk)
+            consume(process_frame(chunk))
+    else:
+        checked = (_require_text(chunk) for chunk in reader)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for processed in _ordered_results(pool, checked, in_flight=workers * 2):
+                consume(processed)
+    return agg
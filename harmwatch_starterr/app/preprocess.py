@@ -1,45 +1,171 @@
+import os
 import re
 import hashlib
-from urllib.parse import urlparse
-from typing import List, Optional
-import nltk
-
-try:
-    from nltk.corpus import stopwords
-    _ = stopwords.words("english")
-except LookupError:
-    import nltk
-    nltk.download("stopwords")
-    from nltk.corpus import stopwords
-
-STOP_WORDS = set(stopwords.words("english"))
-SALT = "change-me-demo-salt"  # <<< change this for your deployment
+import logging
+from functools import lru_cache
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional
+
+from stopwords_en import ENGLISH_STOP_WORDS
+
+logger = logging.getLogger(__name__)
+
+def load_stop_words(source: str = "vendored") -> FrozenSet[str]:
+    """
+    Stopwords used by clean_text. "vendored" (default) is the frozen list shipped with
+    HarmWatch; "nltk" reads the locally installed NLTK corpus instead. NLTK is never
+    downloaded: if it or its corpus is missing, the vendored list is used.
+    """
+    if source == "nltk":
+        try:
+            from nltk.corpus import stopwords
+            return frozenset(stopwords.words("english"))
+        except (ImportError, LookupError) as e:
+            logger.warning("NLTK stopwords unavailable (%s); using vendored list", type(e).__name__)
+    return ENGLISH_STOP_WORDS
+
+# Set HARMWATCH_STOPWORDS=nltk to use the installed NLTK corpus
+STOP_WORDS = load_stop_words(os.getenv("HARMWATCH_STOPWORDS", "vendored"))
+# Author hashing key: set HARMWATCH_HASH_KEY for your deployment
+DEMO_SALT = "change-me-demo-salt"
+SALT = os.getenv("HARMWATCH_HASH_KEY", DEMO_SALT)
 URL_REGEX = re.compile(r"(https?://\S+)")
+# Authority (userinfo@host:port) of each URL, i.e. what urlparse().netloc returns
+_AUTHORITY_RE = re.compile(r"https?://([^\s/?#]+)")
+_HOST_TRAILING = ".,;!'\")]}>"
+
+_LINK_RE = re.compile(r"http\S+")
+_MENTION_RE = re.compile(r"@\w+")
+_NON_ALNUM_RE = re.compile(r"[^A-Za-z0-9\s]")
+# bytes.translate table for ASCII text: keep letters, digits and whitespace, blank the rest
+_ASCII_KEEP = bytes(
+    c if chr(c).isalnum() or chr(c).isspace() else ord(" ") for c in range(128)
+) + b" " * 128
 
 def clean_text(text: str) -> str:
     if text is None:
         return ""
-    text = re.sub(r"http\S+", " ", str(text))
-    text = re.sub(r"@\w+", " ", text)
-    text = re.sub(r"#", " ", text)
-    text = re.sub(r"[^A-Za-z0-9\s]", " ", text)
-    text = re.sub(r"\s+", " ", text).strip().lower()
-    text = " ".join(w for w in text.split() if w not in STOP_WORDS)
-    return text
+    text = _LINK_RE.sub(" ", str(text))
+    text = _MENTION_RE.sub(" ", text)
+    # '#' and every other non-alphanumeric character become a space
+    if text.isascii():
+        text = text.encode("ascii").translate(_ASCII_KEEP).decode("ascii")
+    else:
+        text = _NON_ALNUM_RE.sub(" ", text)
+    # split() also collapses/strips whitespace, so stopwords are dropped in the same pass
+    return " ".join([w for w in text.lower().split() if w not in STOP_WORDS])
+
+def clean_texts(texts: Iterable[str]) -> List[str]:
+    """Batch clean_text over a list or Series; repeated posts are only cleaned once."""
+    texts = list(texts)
+    try:
+        repeats = len(set(texts)) < len(texts)
+    except TypeError:  # unhashable rows
+        repeats = False
+    if not repeats:
+        # All distinct: a cache would only add lookups
+        return list(map(clean_text, texts))
+    cleaned = {text: clean_text(text) for text in set(texts) if isinstance(text, str)}
+    return [cleaned[text] if isinstance(text, str) else clean_text(text) for text in texts]
+
+def _sha256_hasher(key: bytes) -> Callable[[str], str]:
+    """Legacy scheme: sha256(key + id), truncated to 16 hex chars."""
+    keyed = hashlib.sha256(key)
+    def hash_id(author_id: str) -> str:
+        h = keyed.copy()
+        h.update(author_id.encode("utf-8"))
+        return h.hexdigest()[:16]
+    return hash_id
+
+def _blake2b_hasher(key: bytes) -> Callable[[str], str]:
+    """Keyed BLAKE2b with an 8-byte digest: 16 hex chars without truncation."""
+    if len(key) > hashlib.blake2b.MAX_KEY_SIZE:
+        key = hashlib.blake2b(key).digest()
+    keyed = hashlib.blake2b(key=key, digest_size=8)
+    def hash_id(author_id: str) -> str:
+        h = keyed.copy()
+        h.update(author_id.encode("utf-8"))
+        return h.hexdigest()
+    return hash_id
+
+HASH_BACKENDS: Dict[str, Callable[[bytes], Callable[[str], str]]] = {
+    "sha256": _sha256_hasher,
+    "blake2b": _blake2b_hasher,
+}
+
+def make_hasher(backend: str = "sha256", key: Optional[str] = None) -> Callable[[str], str]:
+    """Build an author hasher for `backend` keyed with `key` (defaults to the configured SALT)."""
+    if backend not in HASH_BACKENDS:
+        raise ValueError(f"Unknown hash backend {backend!r}; expected one of {sorted(HASH_BACKENDS)}")
+    return HASH_BACKENDS[backend]((SALT if key is None else key).encode("utf-8"))
+
+# sha256 keeps hashes compatible with existing data; blake2b is faster.
+# Switching changes every author_hash, see storage.migrate_author_hashes.
+HASH_BACKEND = os.getenv("HARMWATCH_HASH_BACKEND", "sha256")
+_hash_author = make_hasher(HASH_BACKEND)
+
+# Feeds are dominated by repeat authors, so hashes sit behind a bounded LRU cache
+HASH_CACHE_SIZE = int(os.getenv("HARMWATCH_HASH_CACHE_SIZE", "65536"))
+_cached_hash = lru_cache(maxsize=HASH_CACHE_SIZE)(_hash_author)
+
+def set_hash_cache_size(maxsize: Optional[int]):
+    """Resize (and empty) the author hash cache; None means unbounded, 0 disables it."""
+    global _cached_hash
+    _cached_hash = lru_cache(maxsize=maxsize)(_hash_author)
+
+def set_hash_backend(backend: str, key: Optional[str] = None):
+    """Switch the hashing backend/key used by anonymize_id (empties the cache)."""
+    global HASH_BACKEND, _hash_author
+    _hash_author = make_hasher(backend, key)
+    HASH_BACKEND = backend
+    set_hash_cache_size(_cached_hash.cache_info().maxsize)
+
+def hash_cache_info() -> Dict[str, Optional[int]]:
+    """Hit/miss counters and fill level of the author hash cache."""
+    info = _cached_hash.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize}
 
 def anonymize_id(author_id: Optional[str]) -> Optional[str]:
     if not author_id:
         return None
-    h = hashlib.sha256((SALT + str(author_id)).encode("utf-8")).hexdigest()
-    return h[:16]
+    return _cached_hash(str(author_id))
 
-def extract_domains(text: str) -> List[str]:
-    domains = []
-    for match in URL_REGEX.findall(text or ""):
+def anonymize_ids(author_ids: Iterable[Optional[str]]) -> List[Optional[str]]:
+    """Batch anonymize_id over a list or Series: each distinct ID is hashed once and mapped back."""
+    author_ids = list(author_ids)
+    hashes = {a: anonymize_id(a) for a in set(author_ids)}
+    return [hashes[a] for a in author_ids]
+
+@lru_cache(maxsize=65536)
+def normalize_domain(netloc: str) -> str:
+    """
+    Canonical host for a URL authority: drops userinfo and port, lowercases,
+    IDNA-encodes non-ASCII names and strips a leading 'www.'.
+    Shared with url_analyzer.extract_domains_from_url so both agree.
+    """
+    host = netloc.rpartition("@")[2]
+    if host.startswith("["):  # IPv6 literal
+        host = host[:host.find("]") + 1]
+    else:
+        host = host.partition(":")[0].rstrip(_HOST_TRAILING)
+    host = host.lower()
+    if not host.isascii():
         try:
-            d = urlparse(match).netloc.lower()
-            if d:
-                domains.append(d)
-        except Exception:
+            host = host.encode("idna").decode("ascii")
+        except UnicodeError:
             pass
-    return sorted(set(domains))
+    return host[4:] if host.startswith("www.") else host
+
+def extract_domains(text: str) -> List[str]:
+    domains = set()
+    for netloc in _AUTHORITY_RE.findall(text or ""):
+        d = normalize_domain(netloc)
+        if d:
+            domains.add(d)
+    return sorted(domains)
+
+def extract_domains_batch(texts: Iterable[str]) -> List[List[str]]:
+    """
+    Batch extract_domains over a list or Series (missing/non-string text gives []).
+    Returns one sorted domain list per input row, in input order.
+    """
+    return [extract_domains(text) if isinstance(text, str) else [] for text in texts]
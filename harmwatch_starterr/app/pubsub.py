@@ -0,0 +1,183 @@
+"""
+Local pub/sub between bridge worker processes (HARMWATCH_UVICORN_WORKERS > 1).
+A hub process listens on a Unix socket. Workers publish batches of classified posts
+to it; the hub numbers every post with a global sequence number and forwards each
+batch to all workers, the publisher included, so the clients of every worker see the
+same posts in the same order with the same seq. The hub never parses posts.
+
+Frames (big-endian):  publish  = count u32, length u32, batch
+                      delivery = first seq u64, count u32, length u32, the same batch
+A batch of n posts is the byte length of a JSON array of the distinct route keys, that
+array, n lengths of the posts' JSON, n indexes into the route keys (unsigned ints in native
+byte order: the hub and its workers share a machine), then the posts' JSON objects back to
+back, so workers route and frame delivered posts without parsing them.
+"""
+import asyncio
+import json
+import logging
+import os
+import struct
+import time
+from array import array
+from contextlib import suppress
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+PUBLISH_HEADER = struct.Struct(">II")
+DELIVERY_HEADER = struct.Struct(">QII")
+# A worker this far behind (bytes the hub has buffered for it) is disconnected; it
+# reconnects at once, and its clients can catch up through replay
+HUB_MAX_BUFFER = int(os.getenv("HARMWATCH_HUB_MAX_BUFFER", str(64 * 1024 * 1024)))
+RECONNECT_SECONDS = 0.5
+
+BATCH_HEADER = struct.Struct("=I")
+
+def encode_batch(texts: List[str], keys: List[Any]) -> bytes:
+    # Posts share a handful of route keys, so each distinct one is sent once
+    distinct: Dict[Any, int] = {}
+    key_ids = array("I", [distinct.setdefault(key, len(distinct)) for key in keys])
+    header = json.dumps(list(distinct), separators=(",", ":")).encode("utf-8")
+    sizes = array("I", map(len, texts))
+    return b"".join((BATCH_HEADER.pack(len(header)), header, sizes.tobytes(), key_ids.tobytes(),
+                     "".join(texts).encode("utf-8")))
+
+def decode_batch(payload: bytes, count: int) -> Tuple[List[str], List[Any]]:
+    """(texts, keys) of an encode_batch payload of `count` posts; the posts are not parsed."""
+    (length,) = BATCH_HEADER.unpack_from(payload)
+    pos = BATCH_HEADER.size + length
+    distinct = [tuple(map(tuple, key)) for key in json.loads(payload[BATCH_HEADER.size:pos])]
+    sizes, key_ids = array("I"), array("I")
+    width = sizes.itemsize * count
+    sizes.frombytes(payload[pos:pos + width])
+    key_ids.frombytes(payload[pos + width:pos + 2 * width])
+    body = payload[pos + 2 * width:].decode("utf-8")
+    texts, start = [], 0
+    for size in sizes:
+        texts.append(body[start:start + size])
+        start += size
+    return texts, [distinct[i] for i in key_ids]
+
+class Hub:
+    """Sequences and forwards published batches to every connected worker."""
+
+    def __init__(self, max_buffer: int = HUB_MAX_BUFFER):
+        self.max_buffer = max_buffer
+        self.workers: Set[asyncio.StreamWriter] = set()
+        self.next_seq = 1
+        self.counters = {"batches": 0, "posts": 0, "lagging_disconnects": 0}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.workers.add(writer)
+        try:
+            while True:
+                count, length = PUBLISH_HEADER.unpack(await reader.readexactly(PUBLISH_HEADER.size))
+                payload = await reader.readexactly(length)
+                header = DELIVERY_HEADER.pack(self.next_seq, count, length)
+                self.next_seq += count
+                self.counters["batches"] += 1
+                self.counters["posts"] += count
+                for worker in list(self.workers):
+                    if worker.transport.get_write_buffer_size() > self.max_buffer:
+                        logger.warning("Disconnecting a worker that is %d bytes behind",
+                                       worker.transport.get_write_buffer_size())
+                        self.counters["lagging_disconnects"] += 1
+                        self.workers.discard(worker)
+                        worker.close()
+                        continue
+                    worker.write(header)
+                    worker.write(payload)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass  # the worker went away
+        finally:
+            self.workers.discard(writer)
+            writer.close()
+
+    async def serve(self, path: str):
+        with suppress(FileNotFoundError):
+            os.unlink(path)
+        server = await asyncio.start_unix_server(self.handle, path)
+        async with server:
+            await server.serve_forever()
+
+def run_hub(path: str):
+    """Process entry point: serve the hub on `path` until killed."""
+    try:
+        asyncio.run(Hub().serve(path))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        with suppress(FileNotFoundError):
+            os.unlink(path)
+
+def wait_for_hub(path: str, timeout: float = 10.0):
+    """Block until the hub accepts connections on `path`."""
+    import socket
+
+    deadline = time.monotonic() + timeout
+    while True:
+        with socket.socket(socket.AF_UNIX) as s:
+            try:
+                s.connect(path)
+                return
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"pub/sub hub did not start on {path}")
+        time.sleep(0.05)
+
+class HubClient:
+    """
+    A worker's connection to the hub. publish() returns False while disconnected, so
+    the caller can deliver locally instead; deliveries() reconnects by itself.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.ready = asyncio.Event()
+        self.counters = {"published": 0, "delivered": 0, "reconnects": 0}
+
+    @property
+    def connected(self) -> bool:
+        return self.writer is not None and not self.writer.is_closing()
+
+    async def wait_connected(self, timeout: float) -> bool:
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        return self.connected
+
+    def publish(self, texts: List[str], keys: List[Any]) -> bool:
+        """Send serialized posts (JSON objects without a seq) and their route keys."""
+        if not self.connected:
+            return False
+        payload = encode_batch(texts, keys)
+        self.writer.write(PUBLISH_HEADER.pack(len(texts), len(payload)))
+        self.writer.write(payload)
+        self.counters["published"] += len(texts)
+        return True
+
+    async def deliveries(self) -> AsyncIterator[Tuple[int, List[str], List[Any]]]:
+        """(first seq, texts, keys) for every batch any worker published, in hub order."""
+        while True:
+            try:
+                reader, self.writer = await asyncio.open_unix_connection(self.path)
+            except OSError:
+                await asyncio.sleep(RECONNECT_SECONDS)
+                continue
+            self.ready.set()
+            try:
+                while True:
+                    first, count, length = DELIVERY_HEADER.unpack(await reader.readexactly(DELIVERY_HEADER.size))
+                    texts, keys = decode_batch(await reader.readexactly(length), count)
+                    self.counters["delivered"] += count
+                    yield first, texts, keys
+            except (asyncio.IncompleteReadError, ConnectionError):
+                logger.warning("Lost the pub/sub hub at %s; reconnecting", self.path)
+                self.counters["reconnects"] += 1
+            finally:
+                self.ready.clear()
+                self.writer.close()
+                self.writer = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"socket": self.path, "connected": self.connected, "pid": os.getpid(), **self.counters}
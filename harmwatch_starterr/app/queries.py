@@ -0,0 +1,98 @@
+"""
+Read-side queries over the SQLite posts table.
+Filtering and aggregation run in SQL on the indexes created by storage.init_db,
+so dashboards and reports never pull the whole table into pandas.
+Counts are summed over `occurrences`, so deduplicated reposts are still counted.
+"""
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from storage import get_store
+
+RISK_ORDER = ["low", "medium", "high"]
+
+def _store(db_path: Optional[str]):
+    store = get_store(db_path)
+    store.ensure_schema()
+    return store
+
+def _date_filter(start: Optional[str], end: Optional[str], clauses: List[str], params: List):
+    # Dates are stored as text (ISO prefix), so string bounds keep the index usable
+    if start:
+        clauses.append("date >= ?")
+        params.append(start)
+    if end:
+        clauses.append("date < ?")
+        params.append(end)
+
+def _where(clauses: List[str]) -> str:
+    return f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+def category_counts(start: Optional[str] = None, end: Optional[str] = None,
+                    db_path: Optional[str] = None) -> Dict[str, int]:
+    """Posts per category, optionally limited to dates in [start, end)."""
+    clauses, params = [], []
+    _date_filter(start, end, clauses, params)
+    df = _store(db_path).query(
+        f"SELECT category, SUM(occurrences) AS posts FROM posts {_where(clauses)} "
+        "GROUP BY category ORDER BY posts DESC", params)
+    return dict(zip(df["category"], df["posts"].astype(int)))
+
+def category_counts_per_day(start: Optional[str] = None, end: Optional[str] = None,
+                            categories: Optional[List[str]] = None,
+                            db_path: Optional[str] = None) -> pd.DataFrame:
+    """
+    Posts per day by category as a day x category frame (the shape st.line_chart expects).
+    Served from the (category, date) index without touching the table rows.
+    """
+    clauses, params = ["date IS NOT NULL", "date != ''"], []
+    if categories:
+        clauses.append(f"category IN ({', '.join('?' * len(categories))})")
+        params.extend(categories)
+    _date_filter(start, end, clauses, params)
+    df = _store(db_path).query(
+        f"SELECT substr(date, 1, 10) AS day, category, SUM(occurrences) AS posts FROM posts {_where(clauses)} "
+        "GROUP BY day, category ORDER BY day", params)
+    if df.empty:
+        return pd.DataFrame()
+    return df.pivot(index="day", columns="category", values="posts").fillna(0)
+
+def top_flagged(limit: int = 50, min_risk: str = "medium", category: Optional[str] = None,
+                start: Optional[str] = None, end: Optional[str] = None,
+                db_path: Optional[str] = None) -> pd.DataFrame:
+    """Highest-risk non-neutral posts (high before medium, newest first)."""
+    levels = RISK_ORDER[RISK_ORDER.index(min_risk):]
+    clauses = [f"risk_level IN ({', '.join('?' * len(levels))})", "category != 'Neutral'"]
+    params: List = list(levels)
+    if category:
+        clauses.append("category = ?")
+        params.append(category)
+    _date_filter(start, end, clauses, params)
+    params.append(limit)
+    return _store(db_path).query(
+        "SELECT platform, date, author_hash, url, domain, text, category, risk_level, occurrences FROM posts "
+        f"{_where(clauses)} "
+        "ORDER BY CASE risk_level WHEN 'high' THEN 0 WHEN 'medium' THEN 1 ELSE 2 END, date DESC "
+        "LIMIT ?", params)
+
+def author_history(author_hash: str, limit: Optional[int] = None,
+                   db_path: Optional[str] = None) -> pd.DataFrame:
+    """All stored posts by one (hashed) author, oldest first."""
+    params: List = [author_hash]
+    sql = ("SELECT platform, date, url, domain, text, category, risk_level FROM posts "
+           "WHERE author_hash = ? ORDER BY date")
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return _store(db_path).query(sql, params)
+
+def domain_counts(limit: int = 20, flagged_only: bool = True,
+                  db_path: Optional[str] = None) -> pd.DataFrame:
+    """Most frequent link domains, by default among flagged posts only."""
+    clauses = ["domain IS NOT NULL", "domain != ''"]
+    if flagged_only:
+        clauses.append("category != 'Neutral'")
+    return _store(db_path).query(
+        f"SELECT domain, SUM(occurrences) AS posts FROM posts {_where(clauses)} "
+        "GROUP BY domain ORDER BY posts DESC LIMIT ?", [limit])
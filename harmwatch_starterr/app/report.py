@@ -1,4 +1,7 @@
 from datetime import datetime
+from typing import Optional
+
+from queries import category_counts, top_flagged
 
 HTML_TMPL = """<!doctype html>
 <html>
@@ -33,3 +36,11 @@ def render_html(summary_counts, examples_table_html) -> str:
     now = datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC")
     rows = "\\n".join(f"<tr><td>{cat}</td><td>{cnt}</td></tr>" for cat, cnt in summary_counts.items())
     return HTML_TMPL.format(now=now, rows=rows, examples=examples_table_html)
+
+def render_stored_report(start: Optional[str] = None, end: Optional[str] = None,
+                         db_path: Optional[str] = None) -> str:
+    """Report over posts stored in SQLite, aggregated in SQL (dates in [start, end))."""
+    summary = category_counts(start, end, db_path=db_path)
+    examples = top_flagged(10, start=start, end=end, db_path=db_path)
+    examples = examples[["platform","date","author_hash","text","category","risk_level"]]
+    return render_html(summary, examples.to_html(index=False, escape=True))
@@ -0,0 +1,131 @@
+"""
+Versioned rule sets for classify.py.
+Rules live in a JSON file (rules.json next to this module, or HARMWATCH_RULES):
+
+    {"version": "...", "shortlinks": [...], "lexicon": "terms.tsv",
+     "labels": {label: {"category": ..., "weight": ..., "pattern": regex, "terms": [phrases],
+                        "near": [{"first": phrase, "then": phrase, "within": tokens}]}}}
+
+Labels are checked in file order (the first matched label picks the category).
+`pattern`, `terms` and `lexicon` are all optional. Terms (inline, or one per line
+in the tab-separated lexicon file with an optional per-term weight) go to the
+token lexicon in lexicon.py; the rare term that starts or ends with punctuation
+is folded into a prefix-trie regex instead. `near` rules match "then" at most
+`within` tokens after "first" (either order with "ordered": false); use them
+instead of unbounded `.*` wildcards in patterns.
+"""
+import hashlib
+import json
+import os
+import re
+from typing import Any, Dict, Iterable, List, Tuple
+
+from lexicon import is_word_term, read_lexicon
+
+RULES_PATH = os.getenv("HARMWATCH_RULES") or os.path.join(os.path.dirname(__file__), "rules.json")
+
+class RuleSet:
+    """A parsed rules file plus the content hash that identifies it."""
+
+    def __init__(self, data: Dict[str, Any], fingerprint: str, path: str = ""):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.version = str(data.get("version", "unversioned"))
+        self.shortlinks = set(data.get("shortlinks", ()))
+        self.labels: Dict[str, Dict[str, Any]] = dict(data["labels"])
+        self.weights = {label: spec.get("weight", 1) for label, spec in self.labels.items()}
+        self.categories = {label: spec.get("category", "Other") for label, spec in self.labels.items()}
+        lexicon = data.get("lexicon")
+        self.lexicon_path = os.path.join(os.path.dirname(path), lexicon) if lexicon else None
+
+    @property
+    def stamp(self) -> str:
+        """Version stamped onto classification results: declared version + content hash."""
+        return f"{self.version}+{self.fingerprint}"
+
+    def sources(self) -> Dict[str, str]:
+        """Regex source per label with a pattern or punctuation-edged terms, in rule order."""
+        out = {}
+        for label, spec in self.labels.items():
+            parts = [spec["pattern"]] if spec.get("pattern") else []
+            odd_terms = [t for t in spec.get("terms", ()) if not is_word_term(t)]
+            if odd_terms:
+                parts.append(terms_regex(odd_terms))
+            if parts:
+                out[label] = "|".join(parts)
+        return out
+
+    def lexicon_entries(self) -> List[Tuple[str, str, int]]:
+        """(term, label, weight) for every word-edged inline term plus the lexicon file."""
+        entries = [(term, label, self.weights[label])
+                   for label, spec in self.labels.items()
+                   for term in spec.get("terms", ()) if is_word_term(term)]
+        if self.lexicon_path:
+            entries.extend(read_lexicon(self.lexicon_path, self.weights))
+        return entries
+
+    def near_rules(self) -> List[Tuple[str, str, str, int, int, bool]]:
+        """(label, first, then, within, weight, ordered) for every proximity rule."""
+        return [(label, rule["first"], rule["then"], int(rule["within"]),
+                 rule.get("weight", self.weights[label]), rule.get("ordered", True))
+                for label, spec in self.labels.items() for rule in spec.get("near", ())]
+
+def load_rules(path: str = None) -> RuleSet:
+    """Read and validate a rules file; the fingerprint hashes its parsed content and lexicon file."""
+    path = path or RULES_PATH
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    labels = data.get("labels")
+    if not isinstance(labels, dict) or not labels:
+        raise ValueError(f"{path}: 'labels' must be a non-empty object")
+    for label, spec in labels.items():
+        if not isinstance(spec, dict):
+            raise ValueError(f"{path}: label '{label}' must be an object")
+        for rule in spec.get("near", ()):
+            if not (rule.get("first") and rule.get("then") and isinstance(rule.get("within"), int)
+                    and rule["within"] >= 0):
+                raise ValueError(f"{path}: label '{label}' near rules need 'first', 'then' and 'within' >= 0")
+    # Key order is kept (it decides category priority); whitespace is not hashed
+    canonical = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    h = hashlib.sha256(canonical.encode("utf-8"))
+    rules = RuleSet(data, "", path)
+    if rules.lexicon_path:
+        with open(rules.lexicon_path, "rb") as f:
+            h.update(f.read())
+    rules.fingerprint = h.hexdigest()[:12]
+    return rules
+
+def terms_regex(terms: Iterable[str]) -> str:
+    """
+    Non-capturing alternation matching exactly the given (lowercased) phrases,
+    factored by common prefix: ["scam", "scammer", "spam"] -> "(?:s(?:cam(?:mer)?|pam))".
+    Callers add any \\b anchors they need.
+    """
+    trie: Dict[str, Any] = {}
+    for term in terms:
+        term = term.strip().lower()
+        if not term:
+            continue
+        node = trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+    if not trie:
+        return r"(?!)"
+    # Several first characters already come back as one (?:...|...) group
+    return _trie_source(trie) if len(trie) > 1 else "(?:" + _trie_source(trie) + ")"
+
+def _trie_source(node: Dict[str, Any]) -> str:
+    end = "" in node
+    branches: List[str] = []
+    for ch in sorted(k for k in node if k):
+        branches.append(re.escape(ch) + _trie_source(node[ch]))
+    if not branches:
+        return ""
+    if len(branches) > 1:
+        return "(?:" + "|".join(branches) + ")" + ("?" if end else "")
+    body = branches[0]
+    if end:
+        # A term ending here makes the rest optional (greedy, so longer terms win)
+        body = body + "?" if len(body) == 1 else "(?:" + body + ")?"
+    return body
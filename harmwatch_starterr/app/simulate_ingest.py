@@ -1,50 +1,53 @@
 import requests
 import json
+import sys
 import time
 from datetime import datetime
 
 BRIDGE_URL = "http://localhost:8000"
 
+SAMPLE_POSTS = [
+    {
+        "text": "Check out this amazing free prize! Click here to claim your gift card now!",
+        "source": "twitter",
+        "author": "user123",
+        "platform": "Twitter",
+        "url": "https://twitter.com/user123/status/123456"
+    },
+    {
+        "text": "I'm feeling really hopeless today. Everything seems so dark.",
+        "source": "instagram",
+        "author": "user456",
+        "platform": "Instagram",
+        "url": "https://instagram.com/p/abcdef/"
+    },
+    {
+        "text": "This is fake news! Don't believe the mainstream media!",
+        "source": "facebook",
+        "author": "user789",
+        "platform": "Facebook",
+        "url": "https://facebook.com/groups/123/posts/456"
+    },
+    {
+        "text": "You're so stupid and worthless. Nobody likes you.",
+        "source": "reddit",
+        "author": "user101",
+        "platform": "Reddit",
+        "url": "https://reddit.com/r/subreddit/comments/123"
+    },
+    {
+        "text": "New CVE-2024-1234 vulnerability discovered. Here's the exploit code...",
+        "source": "hacker_forum",
+        "author": "hacker_user",
+        "platform": "Forum",
+        "url": "https://hackerforum.com/threads/123"
+    }
+]
+
 def ingest_sample_data():
     """Simulate ingesting sample data to the bridge server."""
     
-    sample_posts = [
-        {
-            "text": "Check out this amazing free prize! Click here to claim your gift card now!",
-            "source": "twitter",
-            "author": "user123",
-            "platform": "Twitter",
-            "url": "https://twitter.com/user123/status/123456"
-        },
-        {
-            "text": "I'm feeling really hopeless today. Everything seems so dark.",
-            "source": "instagram",
-            "author": "user456",
-            "platform": "Instagram",
-            "url": "https://instagram.com/p/abcdef/"
-        },
-        {
-            "text": "This is fake news! Don't believe the mainstream media!",
-            "source": "facebook",
-            "author": "user789",
-            "platform": "Facebook",
-            "url": "https://facebook.com/groups/123/posts/456"
-        },
-        {
-            "text": "You're so stupid and worthless. Nobody likes you.",
-            "source": "reddit",
-            "author": "user101",
-            "platform": "Reddit",
-            "url": "https://reddit.com/r/subreddit/comments/123"
-        },
-        {
-            "text": "New CVE-2024-1234 vulnerability discovered. Here's the exploit code...",
-            "source": "hacker_forum",
-            "author": "hacker_user",
-            "platform": "Forum",
-            "url": "https://hackerforum.com/threads/123"
-        }
-    ]
+    sample_posts = [dict(post) for post in SAMPLE_POSTS]
     
     print("Starting data ingestion simulation...")
     
@@ -69,6 +72,18 @@ def ingest_sample_data():
     
     print("Data ingestion simulation completed!")
 
+def ingest_batch(posts):
+    """Send many posts in one /ingest/batch request (NDJSON body)."""
+    body = "\n".join(json.dumps(post) for post in posts)
+    response = requests.post(f"{BRIDGE_URL}/ingest/batch", data=body.encode("utf-8"),
+                             headers={"Content-Type": "application/x-ndjson"})
+    if response.status_code == 200:
+        result = response.json()
+        print(f"✅ Ingested batch: {result['accepted']} accepted, {result['duplicates']} duplicates")
+    else:
+        print(f"❌ Failed to ingest batch: {response.status_code} {response.text[:200]}")
+    return response
+
 def check_bridge_health():
     """Check if the bridge server is running."""
     try:
@@ -89,7 +104,10 @@ if __name__ == "__main__":
     print("=" * 40)
     
     if check_bridge_health():
-        ingest_sample_data()
+        if "--batch" in sys.argv:
+            ingest_batch(SAMPLE_POSTS)
+        else:
+            ingest_sample_data()
     else:
         print("\nPlease start the bridge server first:")
         print("cd harmwatch_starter/app")
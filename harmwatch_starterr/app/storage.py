@@ -1,22 +1,221 @@
 import sqlite3
 import os
+import threading
+import time
+from typing import Dict, Iterable, Optional
+import numpy as np
 import pandas as pd
 
+from preprocess import HASH_BACKEND, make_hasher
+
 DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "harmwatch.db")
+# Rows per executemany transaction; override with HARMWATCH_DB_BATCH_SIZE
+DEFAULT_BATCH_SIZE = int(os.getenv("HARMWATCH_DB_BATCH_SIZE", "10000"))
+
+POSTS_SCHEMA = """CREATE TABLE IF NOT EXISTS posts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    platform TEXT, date TEXT, author_hash TEXT,
+    url TEXT, domain TEXT,
+    text TEXT, clean_text TEXT,
+    category TEXT, risk_level TEXT,
+    content_hash TEXT, occurrences INTEGER NOT NULL DEFAULT 1,
+    rules_version TEXT
+)"""
+
+# Columns added after the first release; ALTERed into older databases
+POSTS_ADDED_COLUMNS = {
+    "content_hash": "TEXT",
+    "occurrences": "INTEGER NOT NULL DEFAULT 1",
+    "rules_version": "TEXT",
+}
+
+# Copies of a post are stored as one row when they were classified alike, by the same
+# author on the same day, so per-day and per-author queries still count every repost.
+# NULL hashes (empty text, legacy rows) are never merged.
+DEDUP_KEY = ("content_hash, category, risk_level, coalesce(author_hash, ''), "
+             "coalesce(substr(date, 1, 10), '')")
+
+# Read paths (see queries.py) filter/group on these columns. Every index slows inserts,
+# so the flagged-post and domain indexes are partial: most posts are Neutral and have no link.
+POSTS_INDEXES = [
+    f"CREATE UNIQUE INDEX IF NOT EXISTS idx_posts_dedup_daily ON posts ({DEDUP_KEY})",
+    "CREATE INDEX IF NOT EXISTS idx_posts_category_date ON posts (category, date, occurrences)",
+    "CREATE INDEX IF NOT EXISTS idx_posts_flagged ON posts (risk_level, date) WHERE category != 'Neutral'",
+    "CREATE INDEX IF NOT EXISTS idx_posts_author_hash ON posts (author_hash)",
+    "CREATE INDEX IF NOT EXISTS idx_posts_linked_domain ON posts (domain, category, occurrences) WHERE domain != ''",
+]
+# Indexes of earlier releases, dropped from existing databases
+POSTS_DROPPED_INDEXES = ["idx_posts_content_hash", "idx_posts_risk_level", "idx_posts_domain", "idx_posts_dedup"]
+
+class PostStore:
+    """
+    Long-lived SQLite connection for the posts table.
+    Uses WAL journaling with synchronous=NORMAL and writes frames with executemany,
+    one transaction per `batch_size` rows.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.db_path = db_path or DB_PATH
+        self.batch_size = batch_size
+        self.lock = threading.Lock()  # Streamlit reruns share the store across threads
+        self.con = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.execute("PRAGMA synchronous=NORMAL")
+        # Index pages stay cached between batches (64 MiB), and the WAL is checkpointed
+        # every 64 MiB instead of 4 MiB, which fsyncs far less often on large saves
+        self.con.execute("PRAGMA cache_size=-65536")
+        self.con.execute("PRAGMA wal_autocheckpoint=16384")
+        self.last_insert = {"rows": 0, "seconds": 0.0, "rows_per_sec": 0.0}
+        self.schema_ready = False
+
+    def init_schema(self):
+        """Create or migrate the posts table and its indexes (a write transaction)."""
+        with self.lock, self.con:
+            self.con.execute(POSTS_SCHEMA)
+            existing = {row[1] for row in self.con.execute("PRAGMA table_info(posts)")}
+            for col, decl in POSTS_ADDED_COLUMNS.items():
+                if col not in existing:
+                    self.con.execute(f"ALTER TABLE posts ADD COLUMN {col} {decl}")
+            for name in POSTS_DROPPED_INDEXES:
+                self.con.execute(f"DROP INDEX IF EXISTS {name}")
+            for sql in POSTS_INDEXES:
+                self.con.execute(sql)
+        self.schema_ready = True
+
+    def ensure_schema(self):
+        """init_schema once per store; later calls take no lock on the database."""
+        if not self.schema_ready:
+            self.init_schema()
+
+    def insert_df(self, df: pd.DataFrame) -> Dict[str, float]:
+        """
+        Append df to posts; returns (and keeps in last_insert) rows, seconds and rows_per_sec.
+        Frames with a content_hash column are deduplicated: the first copy of a post is stored
+        and later copies with the same DEDUP_KEY (in this frame or already in the table) only
+        bump its occurrences.
+        """
+        start = time.perf_counter()
+        total = len(df)
+        if "content_hash" in df.columns:
+            df = _collapse_duplicates(df)
+        cols = list(df.columns)
+        sql = f"INSERT INTO posts ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})"
+        if "content_hash" in cols:
+            sql += (f" ON CONFLICT ({DEDUP_KEY})"
+                    " DO UPDATE SET occurrences = occurrences + excluded.occurrences")
+        # tolist() yields Python scalars (SQLite stores NaN as NULL); whole columns at once
+        # are far cheaper than slicing the frame per batch
+        columns = [df[c].tolist() for c in cols]
+        with self.lock:
+            for i in range(0, len(df), self.batch_size):
+                rows = zip(*(column[i:i + self.batch_size] for column in columns))
+                with self.con:
+                    self.con.executemany(sql, rows)
+        seconds = time.perf_counter() - start
+        self.last_insert = {"rows": total, "stored_rows": len(df), "seconds": seconds,
+                            "rows_per_sec": total / seconds if seconds else 0.0}
+        return self.last_insert
+
+    def query(self, sql: str, params: Iterable = ()) -> pd.DataFrame:
+        """Run a read query on the shared connection and return the result as a frame."""
+        with self.lock:
+            return pd.read_sql_query(sql, self.con, params=list(params))
+
+    def close(self):
+        with self.lock:
+            self.con.close()
+
+def _collapse_duplicates(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Keep the first row per DEDUP_KEY with an occurrences count; NULL-hash rows pass
+    through, each counting once.
+    """
+    hashed = df["content_hash"].notna().to_numpy()
+    if not df.loc[hashed, "content_hash"].duplicated().any():
+        return df.assign(occurrences=1)  # the usual case, and cheap to rule out
+    # The same key as DEDUP_KEY; positional, as a concatenated frame may repeat index labels
+    key = pd.DataFrame({c: df[c].to_numpy() for c in ("content_hash", "category", "risk_level") if c in df.columns})
+    if "author_hash" in df.columns:
+        key["author"] = df["author_hash"].fillna("").to_numpy()
+    if "date" in df.columns:
+        key["day"] = df["date"].fillna("").astype(str).str[:10].to_numpy()
+    key = key[hashed]
+    occurrences = np.ones(len(df), dtype=int)
+    keep = np.ones(len(df), dtype=bool)
+    occurrences[hashed] = key.groupby(list(key.columns), sort=False, dropna=False)["content_hash"].transform("size")
+    keep[hashed] = ~key.duplicated().to_numpy()
+    return df[keep].assign(occurrences=occurrences[keep])
+
+_stores: Dict[str, PostStore] = {}
+_stores_lock = threading.Lock()
+
+def get_store(db_path: Optional[str] = None) -> PostStore:
+    """Shared PostStore per database path (created on first use)."""
+    path = db_path or DB_PATH
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = PostStore(path)
+        return _stores[path]
 
 def init_db():
-    con = sqlite3.connect(DB_PATH)
-    con.execute("""CREATE TABLE IF NOT EXISTS posts (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        platform TEXT, date TEXT, author_hash TEXT,
-        url TEXT, domain TEXT,
-        text TEXT, clean_text TEXT,
-        category TEXT, risk_level TEXT
-    )""")
-    con.commit()
-    con.close()
-
-def insert_df(df: pd.DataFrame):
-    con = sqlite3.connect(DB_PATH)
-    df.to_sql("posts", con, if_exists="append", index=False)
-    con.close()
+    get_store().init_schema()
+
+def posts_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Select/derive the posts table columns from a processed frame."""
+    out = df[["platform","date","author_hash","url"]].copy()
+    out["domain"] = df["domains"].apply(lambda x: x[0] if isinstance(x, list) and x else "")
+    out["text"] = df["text"]
+    out["clean_text"] = df["clean_text"]
+    out["category"] = df["category"]
+    out["risk_level"] = df["risk_level"]
+    for col in ("content_hash", "rules_version"):
+        if col in df.columns:
+            out[col] = df[col]
+    return out
+
+def insert_df(df: pd.DataFrame) -> Dict[str, float]:
+    return get_store().insert_df(df)
+
+def migrate_author_hashes(author_ids: Iterable[str], to_backend: str, to_key: Optional[str] = None,
+                          from_backend: str = HASH_BACKEND, from_key: Optional[str] = None,
+                          db_path: Optional[str] = None) -> Dict[str, int]:
+    """
+    Rewrite posts.author_hash from one hashing backend/key to another.
+    Hashes are one-way, so the raw author IDs have to be supplied (e.g. the author_id
+    column of the original exports); rows whose hash matches none of them are left as-is.
+    Returns {"authors": distinct IDs supplied, "rows": rows rewritten}.
+    """
+    old_hash, new_hash = make_hasher(from_backend, from_key), make_hasher(to_backend, to_key)
+    pairs = {old_hash(str(a)): new_hash(str(a)) for a in set(author_ids) if a}
+    con = sqlite3.connect(db_path or DB_PATH)
+    try:
+        con.execute("CREATE TEMP TABLE hash_map (old TEXT PRIMARY KEY, new TEXT NOT NULL)")
+        con.executemany("INSERT INTO hash_map VALUES (?, ?)", pairs.items())
+        cur = con.execute("""UPDATE posts
+            SET author_hash = (SELECT new FROM hash_map WHERE old = posts.author_hash)
+            WHERE author_hash IN (SELECT old FROM hash_map)""")
+        con.commit()
+        return {"authors": len(pairs), "rows": cur.rowcount}
+    finally:
+        con.close()
+
+if __name__ == "__main__":
+    import argparse
+    from preprocess import DEMO_SALT, SALT
+    parser = argparse.ArgumentParser(description="Re-hash author_hash in harmwatch.db")
+    parser.add_argument("ids_csv", help="CSV with an author_id column (e.g. the original uploads)")
+    parser.add_argument("--to", dest="to_backend", default="blake2b", help="target hash backend")
+    parser.add_argument("--from", dest="from_backend", default=HASH_BACKEND, help="current hash backend")
+    parser.add_argument("--to-key", default=SALT, help="target key (default: HARMWATCH_HASH_KEY)")
+    parser.add_argument("--from-key", default=SALT,
+                        help=f"key the current hashes were made with (default: HARMWATCH_HASH_KEY; "
+                             f"databases from before it was set used {DEMO_SALT!r})")
+    parser.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args()
+    ids = pd.read_csv(args.ids_csv, usecols=["author_id"], dtype=str)["author_id"].dropna()
+    stats = migrate_author_hashes(ids, args.to_backend, to_key=args.to_key, from_backend=args.from_backend,
+                                  from_key=args.from_key, db_path=args.db)
+    print(f"Rewrote {stats['rows']} rows for {stats['authors']} authors ({args.from_backend} -> {args.to_backend}).")
+    print(f"Set HARMWATCH_HASH_BACKEND={args.to_backend} so new rows use the same scheme.")
+    if args.to_key != SALT:
+        print("Set HARMWATCH_HASH_KEY to the --to-key value so new rows use the same key.")
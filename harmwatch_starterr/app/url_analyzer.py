@@ -3,6 +3,8 @@ from bs4 import BeautifulSoup
 from urllib.parse import urlparse
 import re
 
+from preprocess import normalize_domain
+
 def fetch_text_from_url(url: str, max_chars=3000) -> str:
     """
     Fetch and extract text content from a URL.
@@ -55,13 +57,11 @@ def fetch_text_from_url(url: str, max_chars=3000) -> str:
 def extract_domains_from_url(url: str) -> list:
     """
     Extract domain names from a URL.
+    Uses the same normalization as preprocess.extract_domains.
     """
     try:
         parsed = urlparse(url)
-        domain = parsed.netloc.lower()
-        if domain.startswith('www.'):
-            domain = domain[4:]
-        return [domain]
+        return [normalize_domain(parsed.netloc)]
     except Exception:
         return []
 